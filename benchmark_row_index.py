@@ -0,0 +1,73 @@
+"""
+Benchmark: matching incoming posts against existing sheet rows.
+
+Compares the old per-post scan of every row (with the post url regex on
+each pair) against SpreadsheetController._index_existing_rows, on a
+synthetic Facebook posts tab. Run from the project root:
+
+    python benchmark_row_index.py [rows] [posts]
+"""
+import sys
+import time
+from datetime import date, timedelta
+
+from controllers.SpreadSheetController import SpreadsheetController
+
+
+def build_rows(row_count: int, compare_date: str):
+    """Rows shaped like A3:R of a posts tab, one row per post per day"""
+    rows = []
+    day = date.fromisoformat(compare_date)
+    posts_per_day = 60
+    for i in range(row_count):
+        written = (day - timedelta(days=i // posts_per_day)).isoformat()
+        post_id = 1000000 + (i % 5000)
+        rows.append(
+            ["1200", written, "message"] + ["10"] * 12 +
+            [f"https://www.facebook.com/123/posts/123_{post_id}?view=insights", written, "3"]
+        )
+    return rows
+
+
+def linear_scan(controller, existing_rows, incoming_ids, compare_date):
+    matches = {}
+    for incoming_post_id in incoming_ids:
+        for row_index, row in enumerate(existing_rows):
+            if len(row) >= 15:
+                existing_post_id = controller.extract_facebook_post_id(row[15])
+                if existing_post_id == incoming_post_id and row[16] == compare_date:
+                    matches[incoming_post_id] = row_index + 3
+    return matches
+
+
+def indexed(controller, existing_rows, incoming_ids, compare_date):
+    index = controller._index_existing_rows(existing_rows, compare_date)
+    return {post_id: index[post_id][0] for post_id in incoming_ids if post_id in index}
+
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    post_count = int(sys.argv[2]) if len(sys.argv) > 2 else 60
+    compare_date = "2025-06-10"
+
+    controller = SpreadsheetController(spreadsheet=None)
+    existing_rows = build_rows(row_count, compare_date)
+    incoming_ids = [str(1000000 + i) for i in range(post_count)]
+
+    start = time.perf_counter()
+    new = indexed(controller, existing_rows, incoming_ids, compare_date)
+    indexed_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    old = linear_scan(controller, existing_rows, incoming_ids, compare_date)
+    scan_time = time.perf_counter() - start
+
+    assert old == new, "indexed matching disagrees with the linear scan"
+    print(f"📊 {row_count} existing rows, {post_count} incoming posts, {len(new)} matched")
+    print(f"   linear scan : {scan_time:8.3f}s")
+    print(f"   hash index  : {indexed_time:8.3f}s")
+    print(f"   speedup     : {scan_time / max(indexed_time, 1e-9):8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 import requests
 import json
 import re
@@ -5,9 +6,30 @@ import time
 from datetime import datetime, timedelta, timezone
 from datetime import date as dt, timedelta
 from collections import defaultdict
-# Calculate date range (Jan 1st to today)
-# Use UTC instead of local time
-end_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+from urllib.parse import urlencode
+from services.HttpClient import get_http_client
+from services.AdaptiveSizer import get_adaptive_sizer, asks_for_less, with_limit
+from services.GraphBatch import get_graph_batch_packer, is_retryable, item_error
+from services.MetricStore import get_metric_store, iter_days, missing_ranges
+from services.PageRegistry import get_page_registry
+from services.PostCache import get_post_cache
+
+# Daily page insights kept in the metric store; page_fans is a lifetime total and is never summed
+PAGE_DAILY_METRICS = [
+    'page_post_engagements', 'page_impressions', 'page_impressions_unique',
+    'page_views_total', 'page_fan_adds', 'page_fans', 'page_daily_follows',
+]
+PAGE_YEARLY_METRICS = ['page_views_total', 'page_post_engagements', 'page_impressions', 'page_impressions_unique']
+LIFETIME_METRICS = {'page_fans'}
+
+# Graph accepts at most 50 ids in one multi-object read
+MAX_IDS_PER_REQUEST = 50
+
+# Fields of every managed page, the same for the full listing and the ids= revalidation
+PAGE_FIELDS = 'id,name,access_token,instagram_business_account'
+
+# Lifetime metrics of every post, used inline in the listing and in batch requests
+POST_INSIGHT_METRICS = 'post_impressions,post_impressions_unique,post_reactions_by_type_total,post_clicks'
 
 class FacebookController:
     
@@ -15,24 +37,84 @@ class FacebookController:
     def __init__(self, FACEBOOK_BASE_API_URL:str, account:list):
         self.account = account
         self.base_url = FACEBOOK_BASE_API_URL
+        self.http = get_http_client()
+        self.batch_packer = get_graph_batch_packer()
+        self.sizer = get_adaptive_sizer()
+        # Single pass mode: post insights come back inline with the post listing
+        self.inline_insights = os.getenv("GRAPH_INLINE_INSIGHTS", "1") != "0"
+        # Filled by prefetch_page_metrics, consumed by the per page calls of this run
+        self._followers = {}
+        self._synced = {}
         print("FacebookController initialized...")
     
+    def _list_pages(self, fields=PAGE_FIELDS):
+        """Every page of the account, following paging.next with a large page size"""
+        pages = []
+        url = self.base_url+self.account[5]+"/accounts"
+        params = {
+            'fields': fields,
+            'limit': 100,
+            'access_token': self.account[4]
+        }
+        while url:
+            response = self.http.get(url, params=params)
+            response.raise_for_status()  # Raise HTTPError for bad responses
+            data = response.json()
+            pages.extend(data.get('data', []))
+            url = data.get('paging', {}).get('next')
+            params = None  # the next link already carries every parameter
+        return pages
+
+    def _revalidate_pages(self, page_ids):
+        """Fresh page tokens and IG links of known pages, None if any of them is no longer reachable"""
+        pages = []
+        for i in range(0, len(page_ids), MAX_IDS_PER_REQUEST):
+            chunk = page_ids[i:i+MAX_IDS_PER_REQUEST]
+            response = self.http.get(self.base_url, params={
+                'ids': ','.join(chunk),
+                'fields': PAGE_FIELDS,
+                'access_token': self.account[4]
+            })
+            response.raise_for_status()
+            data = response.json()
+            if any(page_id not in data or 'access_token' not in data[page_id] for page_id in chunk):
+                return None
+            pages.extend(data[page_id] for page_id in chunk)
+        return pages
+
     def get_facebook_pages_with_instagram(self):
+        """
+        Pages of the account with their tokens and IG links. Known pages are
+        checked against an id-only listing, so pages granted or removed since
+        the last run are noticed right away, and revalidated with one ids=
+        read; the account is listed in full only when the page registry entry
+        is missing, expired, from another token or no longer matches.
+        """
+        registry = get_page_registry()
         try:
             print("Fetching pages and link ig from Facebook...")
-            params = {
-                'fields': 'id,name,access_token,instagram_business_account',
-                'access_token': self.account[4]
-            }
-            response = requests.get(self.base_url+self.account[5]+"/accounts", params=params)
-            response.raise_for_status()  # Raise HTTPError for bad responses
-            return response.json()      # Returns a dict
+            known = registry.fresh_pages(self.account[5], self.account[4])
+            if known:
+                try:
+                    known_ids = [page['id'] for page in known]
+                    listed_ids = {page['id'] for page in self._list_pages(fields='id')}
+                    pages = self._revalidate_pages(known_ids) if listed_ids == set(known_ids) else None
+                    if pages is not None:
+                        registry.save(self.account[5], self.account[4], pages, listed=False)
+                        return {'data': pages}
+                    print("Known pages changed, listing them again...")
+                except requests.exceptions.RequestException as e:
+                    print(f"Revalidating pages failed, listing them again: {str(e)}")
+
+            pages = self._list_pages()
+            registry.save(self.account[5], self.account[4], pages, listed=True)
+            return {'data': pages}      # Same shape as the /accounts answer
         except requests.exceptions.RequestException as e:
             return {"error": str(e)}
     
 
-    def _get_posts_for_page(self, page_id, page_token, since, until):
-        """Fetch posts for a single page with pagination handling"""
+    def _get_posts_for_page(self, page_id, page_token, since, until, with_insights=False):
+        """Fetch posts for a single page with pagination handling, returns (posts, listed completely)"""
         print(f"Requesting: {page_id}")
         all_posts = []
         url = f"{self.base_url}/{page_id}/posts"
@@ -45,54 +127,106 @@ class FacebookController:
         #     'limit': 100  # Maximum per request
         # }
 
+        fields = 'id,message,created_time'
+        if with_insights:
+            # Nested field expansion, each post carries its own insights
+            fields += f',insights.metric({POST_INSIGHT_METRICS})'
+
         # for debugging
         params = {
             'access_token': page_token,
-            'fields': 'id,message,created_time',
+            'fields': fields,
             'since': f"{since}",# Format: "2025-01-01"
-            'until': f"{end_date}", # today
-            'limit': 100  # Maximum per request
+            'until': f"{until}", # today
         }
 
-        
-        
         while url:
             try:
-                response = requests.get(url, params=params, timeout=30)
+                # Page size is learned per endpoint, the next link gets the current size too
+                limit = self.sizer.size('fb_posts')
+                started = time.monotonic()
+                response = self.http.get(with_limit(url, limit), params=params, timeout=30)
                 response.raise_for_status()
                 data = response.json()
+                self.sizer.observe('fb_posts', time.monotonic() - started)
                 
                 all_posts.extend(data.get('data', []))
                 
                 # Paginate WITHOUT resetting params
                 url = data.get('paging', {}).get('next')
             except requests.exceptions.RequestException as e:
+                if asks_for_less(e) and self.sizer.shrink('fb_posts', limit):
+                    # Ask for the same page again with fewer posts
+                    continue
+                if with_insights:
+                    # One bad insights edge fails the whole listing, list plainly and batch instead
+                    print(f"⚠️ Inline insights failed for page {page_id}, falling back to batches: {str(e)}")
+                    return self._get_posts_for_page(page_id, page_token, since, until)
                 print(f"Error fetching posts for page {page_id}: {str(e)}")
-                break
+                return all_posts, False
             except json.JSONDecodeError:
                 print(f"Invalid JSON response from page {page_id}")
-                break
+                return all_posts, False
         
-        return all_posts
+        return all_posts, True
+
+    @staticmethod
+    def _graph_timestamp(value):
+        """Unix timestamp of a Graph created_time or a plain YYYY-MM-DD (UTC)"""
+        if len(value) == 10:
+            return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp())
+        return int(datetime.strptime(value, '%Y-%m-%dT%H:%M:%S%z').timestamp())
+
+    def _list_window_posts(self, page_id, page_token, since, until):
+        """
+        Posts of the page created in [since, until) and whether the listing
+        got through. Only posts newer than the page's watermark are listed
+        (with their inline insights); the rest of the window comes from the
+        post cache and gets its insights in the batch stage.
+        """
+        cache = get_post_cache()
+        watermark = cache.watermark(page_id)
+        list_since = since
+        if watermark and watermark > since:
+            # The watermark post itself is listed again and deduplicated below
+            list_since = self._graph_timestamp(watermark)
+
+        listed, complete = self._get_posts_for_page(page_id, page_token, list_since, until, with_insights=self.inline_insights)
+        cache.put(page_id, listed, until, advance=complete)
+        cache.prune(page_id, since)
+
+        listed_ids = {post.get('id') for post in listed}
+        cached = [post for post in cache.window(page_id, since, until) if post['id'] not in listed_ids]
+        print(f"Page {page_id}: {len(listed)} posts listed since {list_since}, {len(cached)} from cache")
+        return listed + cached, complete
 
     def fetch_all_posts_for_pages(self, page_tokens, since, until):
         print("Page Tokens")
         print(page_tokens)
         all_posts = []
+        failed = False
         for page_id, page_token, ig_id in page_tokens:
             try:
-                posts = self._get_posts_for_page(page_id, page_token, since, until)
+                posts, complete = self._list_window_posts(page_id, page_token, since, until)
+                failed = failed or not complete
                 for post in posts:
-                    all_posts.append({
+                    post_data = {
                         'source_page_id': page_id,  # Track origin page
                         'source_page_token': page_token,  # Keep token for later use
                         'post_id': post.get('id'),
                         'created_time': post.get('created_time'),
                         'message': (post.get('message') or '')[:200]
-                    })
+                    }
+                    # Posts without usable inline insights are left for the batch stage
+                    inline = post.get('insights')
+                    if isinstance(inline, dict) and isinstance(inline.get('data'), list) and inline['data']:
+                        post_data['insights'] = self._parse_insights(inline['data'])
+                    all_posts.append(post_data)
             except Exception as e:
                 print(f"Error processing page {page_id}: {str(e)}")
-        return all_posts
+                failed = True
+        # None tells the caller a listing failed, [] that there were no posts
+        return None if failed else all_posts
 
     def process_posts_and_get_insights(self, posts, page_token, page_id):
         """Process posts and get insights with complete error protection"""
@@ -173,36 +307,24 @@ class FacebookController:
                 
         return metrics
 
+    def _insight_requests(self, post_ids, page_token):
+        """Batch items asking for the insights of each post"""
+        base_params = f"metric={POST_INSIGHT_METRICS}&access_token={page_token}"
+        return [
+            {"method": "GET", "relative_url": f"{post_id}/insights?{base_params}"}
+            for post_id in post_ids
+        ]
+
     def get_insights_batch(self, post_ids, page_token):
         """Get insights for a batch of posts with robust error handling"""
         if not post_ids:
             return []
-            
-        batch_requests = []
-        base_params = f"metric=post_impressions,post_impressions_unique,post_reactions_by_type_total,post_clicks&access_token={page_token}"
-        
-        for post_id in post_ids:
-            batch_requests.append({
-                "method": "GET",
-                "relative_url": f"{post_id}/insights?{base_params}"
-            })
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}",
-                data={
-                    'access_token': page_token,
-                    'batch': json.dumps(batch_requests)
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"Batch request failed: {str(e)}")
-            # Return empty insights for all requested posts
-            return [{'data': []} for _ in post_ids]
-    
+
+        responses = self.batch_packer.fetch(
+            self.base_url, [(page_token, item) for item in self._insight_requests(post_ids, page_token)]
+        )
+        # Empty insights for posts whose batch failed
+        return [response if response is not None else {'data': []} for response in responses]
 
     def process_all_pages_insights(self, posts_data):
         """Process insights for all posts while maintaining page associations"""
@@ -214,173 +336,224 @@ class FacebookController:
             key = (post['source_page_id'], post['source_page_token'])
             page_groups[key].append(post)
         
-        # Process each page's posts
-        all_insights = []
+        # Collect the posts still missing insights across all pages
+        pending = []
         for (page_id, page_token), posts in page_groups.items():
-            print(f"Processing {len(posts)} posts for page {page_id}")
-            
-            # Process in batches of 50
-            for i in range(0, len(posts), 50):
-                batch = posts[i:i+50]
-                post_ids = [p['post_id'] for p in batch]
-                
-                try:
-                    insights_batch = self.get_insights_batch(post_ids, page_token)
-                    print(f"Fetched insights for batch {i//50 + 1}")
-                    # print(insights_batch)
-                    for post, insights in zip(batch, insights_batch):
-                        # print(f"Processing insights for post {post['post_id']}")
-                        # print(insights)
-                        body = json.loads(insights.get('body', '{}'))
-                        parsed_metrics = self._parse_insights(body.get('data', []))
-                        # post['insights'] = self._parse_insights(insights.get('data', []))
-                        # parsed = self._parse_insights(insights.get('data', []))
-                        post['insights'] = parsed_metrics
-                        post['post_link'] = f"https://www.facebook.com/{post['source_page_id']}/posts/{post['post_id']}?view=insights"
-                        all_insights.append(post)
-                        # print(all_insights)
-                except Exception as e:
-                    print(f"Error processing batch: {str(e)}")
-                    for post in batch:
-                        post['insights'] = self._create_empty_insights()
-                        all_insights.append(post)
+            # Posts listed with inline insights skip the batch stage
+            page_pending = [post for post in posts if 'insights' not in post]
+            print(f"Processing {len(posts)} posts for page {page_id} ({len(posts) - len(page_pending)} with inline insights)")
+            for post in posts:
+                if 'insights' in post:
+                    post['post_link'] = f"https://www.facebook.com/{post['source_page_id']}/posts/{post['post_id']}?view=insights"
+            pending.extend(page_pending)
+
+        # Every item carries its page token, so the packer fills each batch across the account's pages
+        responses = self.batch_packer.fetch(self.base_url, [
+            (post['source_page_token'], self._insight_requests([post['post_id']], post['source_page_token'])[0])
+            for post in pending
+        ], batch_token=self.account[4])
+        print(f"Fetched insights for {len(pending)} posts")
+
+        unresolved = set()
+        deleted = set()
+        for post, insights in zip(pending, responses):
+            if is_retryable(insights):
+                # Still failing after the packer's retries, better no row than a row of zeros
+                unresolved.add(id(post))
+                continue
+            error = item_error(insights)
+            if error.get('code') == 100 and error.get('error_subcode') == 33:
+                # Post deleted since it was cached, drop it for good
+                get_post_cache().forget(post['source_page_id'], post['post_id'])
+                unresolved.add(id(post))
+                deleted.add(id(post))
+                continue
+            if error or insights.get('code') != 200:
+                # Permanent item errors (bad token, missing permission, ...) are not zeros either
+                print(f"❌ Insights of post {post['post_id']} failed: {error.get('message', insights.get('code'))}")
+                unresolved.add(id(post))
+                continue
+            try:
+                body = json.loads(insights.get('body') or '{}')
+                post['insights'] = self._parse_insights(body.get('data', []))
+                post['post_link'] = f"https://www.facebook.com/{post['source_page_id']}/posts/{post['post_id']}?view=insights"
+            except Exception as e:
+                print(f"Error processing insights for post {post['post_id']}: {str(e)}")
+                unresolved.add(id(post))
+
+        if deleted:
+            print(f"🗑️ Dropped {len(deleted)} deleted posts from the post cache")
+        if len(unresolved) > len(deleted):
+            dropped = [post['post_id'] for post in pending if id(post) in unresolved - deleted]
+            print(f"⚠️ Leaving out {len(dropped)} posts whose insights could not be fetched: {', '.join(dropped)}")
+
+        # Keep the original page grouping and post order
+        all_insights = []
+        for posts in page_groups.values():
+            all_insights.extend(post for post in posts if id(post) not in unresolved)
         
         return all_insights
 
-    def get_yearly_metrics(self, page_id, page_access_token):
-        today = datetime.now(timezone.utc).date() - timedelta(days=1)  # yesterday's date in UTC
-        start_of_year = today.replace(month=1, day=1)
-        current_start = start_of_year
-
-        yearly_totals = {
-            'page_views_total': 0,
-            'page_post_engagements': 0,
-            'page_impressions': 0,
-            'page_impressions_unique': 0,
-        }
+    def _sync_pages_insights(self, pages, start, end):
+        """
+        Fetch the days of [start, end] the metric store is missing (normally
+        just the last few) for every (page_id, page_token). All monthly chunks
+        of all pages go out as one packed batch, each item with its page token.
+        Returns the page ids whose store is now up to date.
+        """
+        store = get_metric_store()
+        requests_to_send = []
+        chunks = []
+        for page_id, page_access_token in pages:
+            if self._synced.get(page_id) == (start, end):
+                continue
+            days = store.days_to_fetch(page_id, 'fb_page_day', start, end)
+            for first, last in missing_ranges(days):
+                # Because Graph API limits date range for insights, fetch monthly chunks
+                current_start = first
+                while current_start <= last:
+                    next_month = (current_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+                    current_end = min(next_month - timedelta(days=1), last)
+                    print(f"Requesting data for {page_id} from {current_start} to {current_end}")
+
+                    # Daily values are keyed by their end_time, so ask from the day before
+                    insights_params = {
+                        'access_token': page_access_token,
+                        'metric': ','.join(PAGE_DAILY_METRICS),
+                        'since': (current_start - timedelta(days=1)).strftime('%Y-%m-%d'),
+                        'until': current_end.strftime('%Y-%m-%d'),
+                        'period': 'day'
+                    }
+                    requests_to_send.append((page_access_token, {
+                        "method": "GET",
+                        "relative_url": f"{page_id}/insights?{urlencode(insights_params)}"
+                    }))
+                    chunks.append((page_id, current_start, current_end))
+                    current_start = current_end + timedelta(days=1)
+
+        responses = self.batch_packer.fetch(self.base_url, requests_to_send, batch_token=self.account[4]) if requests_to_send else []
+
+        failed = set()
+        for (page_id, current_start, current_end), response in zip(chunks, responses):
+            if not response or response.get('code') != 200:
+                print(f"Error fetching insights for {page_id}: {(response or {}).get('body', 'no response')}")
+                failed.add(page_id)
+                continue
 
-        # Because Graph API limits date range for insights, fetch monthly chunks
-        while current_start <= today:
-            # Calculate end of current month chunk
-            next_month = (current_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-            current_end = min(next_month - timedelta(days=1), today)
-
-            # Print the date range being requested
-            print(f"Requesting data from {current_start} to {current_end}")
-
-            insights_params = {
-                'access_token': page_access_token,
-                'metric': 'page_post_engagements,page_impressions,page_impressions_unique,page_views_total',
-                'since': current_start.strftime('%Y-%m-%d'),
-                'until': current_end.strftime('%Y-%m-%d'),
-                'period': 'day'  # get daily breakdown to sum
-            }
-            
-            url = f"{self.base_url}{page_id}/insights"
-            response = requests.get(url, params=insights_params)
-            if response.status_code != 200:
-                print(f"Error fetching insights: {response.status_code} - {response.text}")
-                return None
+            values = defaultdict(dict)
+            for entry in json.loads(response.get('body') or '{}').get('data', []):
+                for val_entry in entry.get('values', []):
+                    day = val_entry.get('end_time', '')[:10]
+                    val = val_entry.get('value', 0)
+                    if isinstance(val, int) and current_start.isoformat() <= day <= current_end.isoformat():
+                        values[entry['name']][day] = val
+
+            store.put_days(page_id, 'fb_page_day', values, iter_days(current_start, current_end))
+
+        synced = set()
+        for page_id, _ in pages:
+            if page_id not in failed:
+                self._synced[page_id] = (start, end)
+                synced.add(page_id)
+        return synced
+
+    def _sync_page_insights(self, page_id, page_access_token, start, end):
+        return page_id in self._sync_pages_insights([(page_id, page_access_token)], start, end)
+
+    def get_followers_counts(self, page_ids):
+        """followers_count of many pages through multi-object ids= reads with the account token"""
+        followers = {}
+        page_ids = list(page_ids)
+        for i in range(0, len(page_ids), MAX_IDS_PER_REQUEST):
+            chunk = page_ids[i:i+MAX_IDS_PER_REQUEST]
+            try:
+                response = self.http.get(self.base_url, params={
+                    'ids': ','.join(chunk),
+                    'fields': 'followers_count',
+                    'access_token': self.account[4]
+                })
+                response.raise_for_status()
+                followers.update(response.json())
+            except requests.exceptions.RequestException as e:
+                # Pages left out here fall back to their own request
+                print(f"⚠️ Bulk followers fetch failed for {len(chunk)} pages: {str(e)}")
+        return followers
 
-            data = response.json().get('data', [])
-            
-            # Sum the daily values for each metric
-            for entry in data:
-                name = entry['name']
-                values = entry.get('values', [])
-                total = sum(item.get('value', 0) for item in values)
+    # Bulk path: followers and page insights of every page of the account in one or two requests
+    def prefetch_page_metrics(self, pages):
+        """pages: [(page_id, page_token)], results are picked up by get_facebook_page_metrics"""
+        if not pages:
+            return
+        print(f"Prefetching followers and insights for {len(pages)} pages...")
+        self._followers.update(self.get_followers_counts(page_id for page_id, _ in pages))
 
-                if name in yearly_totals:
-                    yearly_totals[name] += total
+        yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+        self._sync_pages_insights(pages, yesterday.replace(month=1, day=1), yesterday)
 
-            current_start = current_end + timedelta(days=1)
+    def get_yearly_metrics(self, page_id, page_access_token):
+        today = datetime.now(timezone.utc).date() - timedelta(days=1)  # yesterday's date in UTC
+        start_of_year = today.replace(month=1, day=1)
 
-        return yearly_totals
+        if not self._sync_page_insights(page_id, page_access_token, start_of_year, today):
+            return None
+        return get_metric_store().sum_days(page_id, PAGE_YEARLY_METRICS, start_of_year, today)
 
     def get_facebook_page_metrics(self, page_id, page_access_token, date_str):
         """
         Fetches Facebook Page metrics including:
         - Followers count (lifetime total)
         - Daily post engagements, impressions, reach, page views, and new likes
-        """
-        from datetime import datetime, date, timedelta
 
+        Daily values come from the local metric store, which is topped up with
+        the days it is missing, so month and year totals cost no extra calls.
+        When the top-up fails the result carries "error" next to the followers
+        count only.
+        """
         try:
             print("Fetching Facebook Page followers and daily insights...")
 
-            # Step 1: Get followers count
-            followers_params = {
-                'access_token': page_access_token,
-                'fields': 'followers_count'
-            }
-            followers_response = requests.get(
-                f"{self.base_url}{page_id}",
-                params=followers_params
-            )
-            followers_response.raise_for_status()
-            followers_data = followers_response.json()
-
-            # Step 2: Get daily insights (for current month up to yesterday)
-            today = date.today()
-            yesterday = today - timedelta(days=1)
-            todaym = yesterday  # Set monthly cutoff to yesterday
-            since = yesterday.replace(day=1).isoformat()
-            until = yesterday.isoformat()
-            print("📅 Date range for insights:", since, until)
-
-            insights_params = {
-                'access_token': page_access_token,
-                'metric': 'page_post_engagements,page_impressions,'
-                        'page_impressions_unique,page_views_total,page_fan_adds,page_fans,page_daily_follows',
-                'period': 'day',
-                'since': since,
-                'until': until
-            }
-            insights_response = requests.get(
-                f"{self.base_url}{page_id}/insights",
-                params=insights_params
-            )
-            insights_response.raise_for_status()
-            insights_data = insights_response.json().get('data', [])
-
-            print("📊 Raw insights data:")
-            print(insights_data)
-
-            # Step 3: Parse and aggregate insights
+            # Step 1: Get followers count (already there when the account was prefetched)
+            followers_data = self._followers.pop(page_id, None)
+            if followers_data is None:
+                followers_params = {
+                    'access_token': page_access_token,
+                    'fields': 'followers_count'
+                }
+                followers_response = self.http.get(
+                    f"{self.base_url}{page_id}",
+                    params=followers_params
+                )
+                followers_response.raise_for_status()
+                followers_data = followers_response.json()
+
+            # Step 2: Bring the store up to date (Jan 1 to yesterday)
+            yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+            first_of_month = yesterday.replace(day=1)
+            start_of_year = yesterday.replace(month=1, day=1)
+            print("📅 Date range for insights:", first_of_month, yesterday)
+
+            if not self._sync_page_insights(page_id, page_access_token, start_of_year, yesterday):
+                # Keep the followers count, the post level stage still needs it
+                return {
+                    'date': date_str,
+                    'id': followers_data.get('id', 0),
+                    'followers_count': followers_data.get('followers_count', 0),
+                    'error': f"Failed to fetch insights for page {page_id}",
+                }
+
+            # Step 3: Day, month-to-date and year-to-date values from the store
+            store = get_metric_store()
             metrics = {}
-            first_of_month = todaym.replace(day=1)
-
-            for entry in insights_data:
-                metric_name = entry['name']
-                values = entry.get('values', [])
-
-                monthly_sum = 0
-                today_value = 0
-
-                for val_entry in values:
-                    date_str = val_entry.get('end_time', '')[:10]
-                    try:
-                        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-                    except ValueError:
-                        continue  # Skip malformed dates
-
-                    if first_of_month <= date_obj <= todaym:
-                        val = val_entry.get('value', 0)
-                        if isinstance(val, int):
-                            monthly_sum += val
-                            if date_obj == todaym:
-                                today_value = val
-
-                metrics[f'{metric_name}_day'] = today_value
-                if 'Lifetime' not in entry.get('title', ''):
-                    metrics[f'{metric_name}_month'] = monthly_sum
-
-            # Step 4: Call your yearly aggregation function
-            yearly_totals = self.get_yearly_metrics(page_id, page_access_token)
+            for metric_name, value in store.get_day(page_id, PAGE_DAILY_METRICS, yesterday).items():
+                metrics[f'{metric_name}_day'] = value
+            monthly_metrics = [m for m in PAGE_DAILY_METRICS if m not in LIFETIME_METRICS]
+            for metric_name, value in store.sum_days(page_id, monthly_metrics, first_of_month, yesterday).items():
+                metrics[f'{metric_name}_month'] = value
+            yearly_totals = store.sum_days(page_id, PAGE_YEARLY_METRICS, start_of_year, yesterday)
             print("📈 Yearly totals:")
             print(yearly_totals)
 
-            # Step 5: Combine all data
+            # Step 4: Combine all data
             return {
                 'date': date_str,
                 'id': followers_data.get('id', 0),
@@ -402,15 +575,11 @@ class FacebookController:
                 'page_impressions_unique_monthly': metrics.get('page_impressions_unique_month', 0),
 
                 # Yearly
-                'yearly_page_views_total': yearly_totals.get('page_views_total', 0) if yearly_totals else 0,
-                'yearly_page_post_engagements': yearly_totals.get('page_post_engagements', 0) if yearly_totals else 0,
-                'yearly_page_impressions': yearly_totals.get('page_impressions', 0) if yearly_totals else 0,
-                'yearly_page_impressions_unique': yearly_totals.get('page_impressions_unique', 0) if yearly_totals else 0,
+                'yearly_page_views_total': yearly_totals.get('page_views_total', 0),
+                'yearly_page_post_engagements': yearly_totals.get('page_post_engagements', 0),
+                'yearly_page_impressions': yearly_totals.get('page_impressions', 0),
+                'yearly_page_impressions_unique': yearly_totals.get('page_impressions_unique', 0),
             }
 
         except requests.exceptions.RequestException as e:
             return {"error": str(e)}
-
-            
-        
-            
\ No newline at end of file
@@ -1,3 +1,4 @@
+import os
 import requests
 import json
 import re
@@ -6,13 +7,31 @@ from datetime import datetime, timedelta, timezone
 from datetime import date as dt
 from collections import defaultdict
 import calendar
-# Use UTC instead of local time
-end_date = datetime.now(timezone.utc).strftime('%Y-%m-%d')
+from urllib.parse import urlencode
+from services.HttpClient import get_http_client
+from services.AdaptiveSizer import get_adaptive_sizer, asks_for_less, with_limit, with_query
+from services.GraphBatch import get_graph_batch_packer, is_retryable, item_error
+from services.MetricStore import get_metric_store
+# Graph accepts at most 50 ids in one multi-object read
+MAX_IDS_PER_REQUEST = 50
+
+# Lifetime metrics of every media, used inline in the listing and in batch requests
+MEDIA_INSIGHT_METRICS = 'reach,views,total_interactions'
 
 class IGController:
     """Controller for IG API interactions."""
-    def __init__(self, FACEBOOK_BASE_API_URL:str):
+    def __init__(self, FACEBOOK_BASE_API_URL:str, account_token:str=None):
         self.base_url = FACEBOOK_BASE_API_URL
+        # User token of the account, only needed for the multi-object ids= reads
+        self.account_token = account_token
+        self.http = get_http_client()
+        self.batch_packer = get_graph_batch_packer()
+        self.sizer = get_adaptive_sizer()
+        # Single pass mode: media insights come back inline with the media listing
+        self.inline_insights = os.getenv("GRAPH_INLINE_INSIGHTS", "1") != "0"
+        # Filled by prefetch_ig_metrics, consumed by the per account calls of this run
+        self._profiles = {}
+        self._periods = {}
         print("FacebookController initialized...")
     
     # get IG page insights (Followers, Engagements, Impressions and Reach)
@@ -25,22 +44,23 @@ class IGController:
 
         try:
             print("[INFO] Fetching basic IG profile data...")
-            params = {
-                'fields': 'followers_count,name,media_count,follows_count',
-                'access_token': page_tokens
-            }
-            response = requests.get(f"{self.base_url}{ig_id}", params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self._profiles.pop(ig_id, None)
+            if data is None:
+                params = {
+                    'fields': 'followers_count,name,media_count,follows_count',
+                    'access_token': page_tokens
+                }
+                response = self.http.get(f"{self.base_url}{ig_id}", params=params)
+                response.raise_for_status()
+                data = response.json()
 
             # Fetch and attach detailed insights
             data['daily_insights'] = self._extract_insight_metrics(
                 self.fetch_daily_insights(ig_id, page_tokens), label='Daily'
             )
-            data['monthly_insights'] = self._extract_insight_metrics(
-                self.fetch_monthly_insights(ig_id, page_tokens), label='Monthly'
-            )
-            yearly_data = self.get_yearly_metrics(ig_id, page_tokens)
+            monthly_raw = self.fetch_monthly_insights(ig_id, page_tokens)
+            data['monthly_insights'] = self._extract_insight_metrics(monthly_raw, label='Monthly')
+            yearly_data = self.get_yearly_metrics(ig_id, page_tokens, current_month=monthly_raw) or {}
 
             data['yearly_insights'] = {
                 'engagements': yearly_data.get('total_interactions', 0),
@@ -84,31 +104,51 @@ class IGController:
 
         return metrics
     
-    # get daily insights for IG page
-    def fetch_daily_insights(self, object_id, access_token):
+    def _daily_period(self):
         today = datetime.now(timezone.utc).date()
         yesterday = today - timedelta(days=1)
-        since = yesterday.strftime('%Y-%m-%d')
-        until = today.strftime('%Y-%m-%d')
+        return yesterday.strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+
+    # Month to date, correctly up to yesterday
+    def _monthly_period(self):
+        yesterday = datetime.now(timezone.utc).date() - timedelta(days=1)
+        first_day_of_month = yesterday.replace(day=1)
+        return first_day_of_month.strftime('%Y-%m-%d'), yesterday.strftime('%Y-%m-%d')
+
+    # get daily insights for IG page
+    def fetch_daily_insights(self, object_id, access_token):
+        since, until = self._daily_period()
         return self.fetch_insights_for_period(object_id, access_token, since, until)
     
     # Get monthly insights for IG page (correctly up to yesterday)
     def fetch_monthly_insights(self, object_id, access_token):
-        today = datetime.now(timezone.utc).date()
-        yesterday = today - timedelta(days=1)
-        first_day_of_month = yesterday.replace(day=1)
-
-        since = first_day_of_month.strftime('%Y-%m-%d')
-        until = yesterday.strftime('%Y-%m-%d')
-
+        since, until = self._monthly_period()
         return self.fetch_insights_for_period(object_id, access_token, since, until)
 
+    def _year_months(self):
+        """(first, last) day of every month from Jan 1 to yesterday, the last one cut at yesterday"""
+        today = datetime.now(timezone.utc).date() - timedelta(days=1)  # yesterday's date in UTC
+        months = []
+        current_start = today.replace(month=1, day=1)
+        while current_start <= today:
+            next_month = (current_start.replace(day=28) + timedelta(days=4)).replace(day=1)
+            current_end = min(next_month - timedelta(days=1), today)
+            months.append((current_start, current_end))
+            current_start = current_end + timedelta(days=1)
+        return months
+
 
     # get yearly insights for IG page
-    def get_yearly_metrics(self, object_id, access_token):
+    def get_yearly_metrics(self, object_id, access_token, current_month=None):
+        """
+        Year-to-date totals as the sum of monthly totals. total_value metrics
+        only come back as one total per period, so each completed month is
+        cached in the metric store once Meta stops revising it, and only the
+        current month is asked for on every run (pass its response in as
+        `current_month` when it was already fetched).
+        """
         today = datetime.now(timezone.utc).date() - timedelta(days=1)  # yesterday's date in UTC
-        start_of_year = today.replace(month=1, day=1)
-        current_start = start_of_year
+        store = get_metric_store()
 
         yearly_totals = {
             'total_interactions': 0,
@@ -117,51 +157,37 @@ class IGController:
         }
 
         # Because Graph API limits date range for insights, fetch monthly chunks
-        while current_start <= today:
-            # Calculate end of current month chunk
-            next_month = (current_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-            current_end = min(next_month - timedelta(days=1), today)
-
-            # Print the date range being requested
-            print(f"Requesting data from {current_start} to {current_end}")
-
-            insights_params = {
-                'access_token': access_token,
-                'metric': 'total_interactions,views,reach',
-                'since': current_start.strftime('%Y-%m-%d'),
-                'until': current_end.strftime('%Y-%m-%d'),
-                'period': 'day',  # get daily breakdown to sum
-                'metric_type': 'total_value',
-            }
-            
-            url = f"{self.base_url}{object_id}/insights"
-            response = requests.get(url, params=insights_params)
-            if response.status_code != 200:
-                print(f"Error fetching insights: {response.status_code} - {response.text}")
-                return None
-
-            data = response.json().get('data', [])
-            
-            # Sum the daily values for each metric
-            for entry in data:
-                name = entry['name']
-                total = entry.get('total_value', {}).get('value', 0)
-
-                if name in yearly_totals:
-                    yearly_totals[name] += total
+        for current_start, current_end in self._year_months():
+            month_totals = store.get_total(object_id, 'ig_month', current_start, current_end)
+            if month_totals is None:
+                if current_end == today and current_month is not None:
+                    response_data = current_month
                 else:
-                    yearly_totals[name] = total  # in case it's not already in the dict
+                    # Print the date range being requested
+                    print(f"Requesting data from {current_start} to {current_end}")
+                    response_data = self.fetch_insights_for_period(
+                        object_id, access_token,
+                        current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d')
+                    )
+                if 'error' in response_data:
+                    print(f"Error fetching insights: {response_data['error']}")
+                    return None
 
-            current_start = current_end + timedelta(days=1)
+                month_totals = {
+                    entry['name']: entry.get('total_value', {}).get('value', 0)
+                    for entry in response_data.get('data', [])
+                }
+                if store.is_settled(current_end, today):
+                    store.put_total(object_id, 'ig_month', current_start, current_end, month_totals)
+
+            # Sum the monthly totals for each metric
+            for name, total in month_totals.items():
+                yearly_totals[name] = yearly_totals.get(name, 0) + total
 
         return yearly_totals
 
-    def fetch_insights_for_period(self, object_id, access_token, since, until):
-        """
-        Fetch 'total_interactions' using daily granularity over a specified date range.
-        """
-        url = f"{self.base_url}{object_id}/insights"
-        params = {
+    def _period_params(self, access_token, since, until):
+        return {
             "metric": "total_interactions,views,reach",
             "metric_type": "total_value",
             "period": "day",  # Always 'day', date range defines daily/monthly/yearly
@@ -170,8 +196,20 @@ class IGController:
             "access_token": access_token
         }
 
+    def fetch_insights_for_period(self, object_id, access_token, since, until):
+        """
+        Fetch 'total_interactions' using daily granularity over a specified date range.
+        """
+        # Served from the bulk prefetch when this account was part of it
+        cached = self._periods.pop((object_id, since, until), None)
+        if cached is not None:
+            return cached
+
+        url = f"{self.base_url}{object_id}/insights"
+        params = self._period_params(access_token, since, until)
+
         try:
-            response = requests.get(url, params=params)
+            response = self.http.get(url, params=params)
             response.raise_for_status()
             return response.json()
         except requests.RequestException as e:
@@ -179,36 +217,77 @@ class IGController:
             return {"error": str(e)}
     
     
+    def get_profiles(self, ig_ids):
+        """Profile fields of many IG accounts through multi-object ids= reads with the account token"""
+        profiles = {}
+        ig_ids = list(ig_ids)
+        if not self.account_token:
+            return profiles
+        for i in range(0, len(ig_ids), MAX_IDS_PER_REQUEST):
+            chunk = ig_ids[i:i+MAX_IDS_PER_REQUEST]
+            try:
+                response = self.http.get(self.base_url, params={
+                    'ids': ','.join(chunk),
+                    'fields': 'followers_count,name,media_count,follows_count',
+                    'access_token': self.account_token
+                })
+                response.raise_for_status()
+                profiles.update(response.json())
+            except requests.exceptions.RequestException as e:
+                # Accounts left out here fall back to their own request
+                print(f"⚠️ Bulk IG profile fetch failed for {len(chunk)} accounts: {str(e)}")
+        return profiles
+
+    # Bulk path: profiles and period insights of every IG account in one or two requests
+    def prefetch_ig_metrics(self, accounts):
+        """accounts: [(ig_id, page_token)], results are picked up by get_ig_page_metrics"""
+        if not accounts:
+            return
+        print(f"[INFO] Prefetching profiles and insights for {len(accounts)} IG accounts...")
+        self._profiles.update(self.get_profiles(ig_id for ig_id, _ in accounts))
+
+        # Day, month to date and every completed month of the year not cached yet
+        store = get_metric_store()
+        months = self._year_months()
+        requests_to_send = []
+        keys = []
+        for ig_id, page_token in accounts:
+            periods = [self._daily_period(), self._monthly_period()]
+            for current_start, current_end in months[:-1]:
+                if store.get_total(ig_id, 'ig_month', current_start, current_end) is None:
+                    periods.append((current_start.strftime('%Y-%m-%d'), current_end.strftime('%Y-%m-%d')))
+            for since, until in periods:
+                params = self._period_params(page_token, since, until)
+                requests_to_send.append((page_token, {
+                    "method": "GET",
+                    "relative_url": f"{ig_id}/insights?{urlencode(params)}"
+                }))
+                keys.append((ig_id, since, until))
+
+        responses = self.batch_packer.fetch(self.base_url, requests_to_send, batch_token=self.account_token)
+        for key, response in zip(keys, responses):
+            # Failed periods are simply asked again by the per account call
+            if response and response.get('code') == 200:
+                self._periods[key] = json.loads(response.get('body') or '{}')
+
+    def _insight_requests(self, post_ids, page_token):
+        """Batch items asking for the insights of each post"""
+        base_params = f"metric={MEDIA_INSIGHT_METRICS}&access_token={page_token}"
+        return [
+            {"method": "GET", "relative_url": f"{post_id}/insights?{base_params}"}
+            for post_id in post_ids
+        ]
+
     def get_insights_batch(self, post_ids, page_token):
         """Get insights for a batch of posts with robust error handling"""
         if not post_ids:
             return []
-            
-        batch_requests = []
-        base_params = f"metric=reach,views,total_interactions&access_token={page_token}"
-        
-        for post_id in post_ids:
-            batch_requests.append({
-                "method": "GET",
-                "relative_url": f"{post_id}/insights?{base_params}"
-            })
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}",
-                data={
-                    'access_token': page_token,
-                    'batch': json.dumps(batch_requests)
-                },
-                timeout=60
-            )
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"Batch request failed: {str(e)}")
-            # Return empty insights for all requested posts
-            return [{'data': []} for _ in post_ids]
 
+        responses = self.batch_packer.fetch(
+            self.base_url, [(page_token, item) for item in self._insight_requests(post_ids, page_token)]
+        )
+        # Empty insights for posts whose batch failed
+        return [response if response is not None else {'data': []} for response in responses]
 
     def _create_empty_insights(self):
         """Return default empty insights structure"""
@@ -256,85 +335,123 @@ class IGController:
             key = (post['source_ig_id'], post['source_page_token'])
             page_groups[key].append(post)
         
-        # Process each page's posts
-        all_insights = []
+        # Collect the posts still missing insights across all pages
+        pending = []
         for (ig_id, page_token), posts in page_groups.items():
-            print(f"Processing {len(posts)} posts for page {ig_id}")
-            
-            # Process in batches of 50
-            for i in range(0, len(posts), 50):
-                batch = posts[i:i+50]
-                post_ids = [p['post_id'] for p in batch]
-                
-                try:
-                    insights_batch = self.get_insights_batch(post_ids, page_token)
-                    print(f"Fetched insights for batch {i//50 + 1}")
-                    # print(insights_batch)
-                    for post, insights in zip(batch, insights_batch):
-                        # print(f"Processing insights for post {post['post_id']}")
-                        # print(insights)
-                        body = json.loads(insights.get('body', '{}'))
-                        parsed_metrics = self._parse_insights(body.get('data', []))
-                        # post['insights'] = self._parse_insights(insights.get('data', []))
-                        # parsed = self._parse_insights(insights.get('data', []))
-                        post['insights'] = parsed_metrics
-                        # post['post_link'] = f"https://www.facebook.com/{post['source_page_id']}/posts/{post['post_id']}?view=insights"
-                        all_insights.append(post)
-                        # print(all_insights)
-                except Exception as e:
-                    print(f"Error processing batch: {str(e)}")
-                    for post in batch:
-                        post['insights'] = self._create_empty_insights()
-                        all_insights.append(post)
+            # Media listed with inline insights skip the batch stage
+            page_pending = [post for post in posts if 'insights' not in post]
+            print(f"Processing {len(posts)} posts for page {ig_id} ({len(posts) - len(page_pending)} with inline insights)")
+            pending.extend(page_pending)
+
+        # Every item carries its page token, so the packer fills each batch across the account's pages
+        responses = self.batch_packer.fetch(self.base_url, [
+            (post['source_page_token'], self._insight_requests([post['post_id']], post['source_page_token'])[0])
+            for post in pending
+        ], batch_token=self.account_token)
+        print(f"Fetched insights for {len(pending)} posts")
+
+        unresolved = set()
+        for post, insights in zip(pending, responses):
+            if is_retryable(insights):
+                # Still failing after the packer's retries, better no row than a row of zeros
+                unresolved.add(id(post))
+                continue
+            error = item_error(insights)
+            if error or insights.get('code') != 200:
+                # Permanent item errors (bad token, missing permission, ...) are not zeros either
+                print(f"❌ Insights of post {post['post_id']} failed: {error.get('message', insights.get('code'))}")
+                unresolved.add(id(post))
+                continue
+            try:
+                body = json.loads(insights.get('body') or '{}')
+                post['insights'] = self._parse_insights(body.get('data', []))
+            except Exception as e:
+                print(f"Error processing insights for post {post['post_id']}: {str(e)}")
+                unresolved.add(id(post))
+
+        if unresolved:
+            dropped = [post['post_id'] for post in pending if id(post) in unresolved]
+            print(f"⚠️ Leaving out {len(dropped)} posts whose insights could not be fetched: {', '.join(dropped)}")
+
+        # Keep the original page grouping and post order
+        all_insights = []
+        for posts in page_groups.values():
+            all_insights.extend(post for post in posts if id(post) not in unresolved)
         
         return all_insights
-    
-    def _get_posts_for_ig(self, ig_id, page_token, since):
-        """Fetch posts for a single page with pagination handling"""
+
+    @staticmethod
+    def _media_time(media):
+        try:
+            return datetime.strptime(media.get('timestamp', ''), '%Y-%m-%dT%H:%M:%S%z')
+        except ValueError:
+            return None
+
+    def _iter_media_for_ig(self, ig_id, page_token, since, with_insights=False):
+        """
+        Yield the account's media newest first, down to `since`.
+
+        /media ignores since/until, so the walk reads each media's timestamp
+        as pages arrive and stops paginating once a page reaches media older
+        than the window, instead of walking the account's whole history.
+        Request errors are raised, so a broken walk is not mistaken for an
+        account without media.
+        """
         print(f"Requesting: {ig_id}")
-        all_posts = []
-        url = f"{self.base_url}/{ig_id}/media"
-        
-        # params = {
-        #     'access_token': page_token,
-        #     'fields': 'id,message,created_time',
-        #     'since': since,# Format: "2025-01-01"
-        #     'until': until, # today
-        #     'limit': 100  # Maximum per request
-        # }
-
-        # for debugging
-        params = {
-            'access_token': page_token,
-            'fields': 'id,caption,media_url,timestamp',
-            'since': f"{since}",# Format: "2025-01-01"
-            'until': f"{end_date}", # today
-            'limit': 100  # Maximum per request
-        }
-        
+        window_start = datetime.strptime(str(since)[:10], '%Y-%m-%d').replace(tzinfo=timezone.utc)
+
+        fields = 'id,caption,media_url,timestamp'
+        if with_insights:
+            # Nested field expansion, each media carries its own insights
+            fields += f',insights.metric({MEDIA_INSIGHT_METRICS})'
+        # Every parameter lives in the URL, the paging.next links carry them on
+        url = with_query(f"{self.base_url}/{ig_id}/media", access_token=page_token, fields=fields)
+
         while url:
             try:
-                response = requests.get(url, params=params, timeout=30)
+                # Page size is learned per endpoint, the next link gets the current size too
+                limit = self.sizer.size('ig_media')
+                started = time.monotonic()
+                response = self.http.get(with_limit(url, limit), timeout=30)
                 response.raise_for_status()
                 data = response.json()
-                
-                all_posts.extend(data.get('data', []))
-                
-                # Paginate WITHOUT resetting params
-                url = data.get('paging', {}).get('next')
+                self.sizer.observe('ig_media', time.monotonic() - started)
             except requests.exceptions.RequestException as e:
+                if asks_for_less(e) and self.sizer.shrink('ig_media', limit):
+                    # Ask for the same page again with fewer posts
+                    continue
+                if with_insights:
+                    # One media type without these metrics fails the whole page, go on plainly and batch instead
+                    print(f"⚠️ Inline insights failed for IG {ig_id}, falling back to batches: {str(e)}")
+                    with_insights = False
+                    url = with_query(url, fields='id,caption,media_url,timestamp')
+                    continue
                 print(f"Error fetching posts for page {ig_id}: {str(e)}")
-                break
+                raise
             except json.JSONDecodeError:
                 print(f"Invalid JSON response from page {ig_id}")
-                break
-        
-        return all_posts
+                raise
+
+            reached_window_start = False
+            for media in data.get('data', []):
+                media_time = self._media_time(media)
+                if media_time is not None and media_time < window_start:
+                    reached_window_start = True
+                    continue
+                yield media
+
+            if reached_window_start:
+                return
+            url = data.get('paging', {}).get('next')
     
     def fetch_all_ig_posts(self, page_tokens, since):
         print("Page Tokens")
         print(page_tokens)
+        # Kept as a list on purpose: it only holds the window's media (the walk
+        # stops at `since`), the insights stage packs batches across all of them,
+        # and None can only be told apart from [] once every walk has finished.
         all_posts = []
+        failed = False
         
         for page_id, page_token, ig_id in page_tokens:
             if ig_id is None:
@@ -342,9 +459,9 @@ class IGController:
                 continue  # Skip this entry if IG ID is missing
 
             try:
-                posts = self._get_posts_for_ig(ig_id, page_token, since)
-                for post in posts:
-                    all_posts.append({
+                # Media are consumed as the walker pages through them
+                for post in self._iter_media_for_ig(ig_id, page_token, since, with_insights=self.inline_insights):
+                    post_data = {
                         'source_page_id': page_id,
                         'source_ig_id': ig_id,
                         'source_page_token': page_token,
@@ -352,8 +469,15 @@ class IGController:
                         'created_time': post.get('timestamp'),
                         'caption': (post.get('caption') or '')[:200],
                         'media_url': post.get('media_url'),
-                    })
+                    }
+                    # Media without usable inline insights are left for the batch stage
+                    inline = post.get('insights')
+                    if isinstance(inline, dict) and isinstance(inline.get('data'), list) and inline['data']:
+                        post_data['insights'] = self._parse_insights(inline['data'])
+                    all_posts.append(post_data)
             except Exception as e:
                 print(f"❌ Error processing page {page_id}: {str(e)}")
+                failed = True
         
-        return all_posts
+        # None tells the caller a walk failed, [] that there were no posts
+        return None if failed else all_posts
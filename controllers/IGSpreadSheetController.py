@@ -8,6 +8,10 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 from google.oauth2.service_account import Credentials
 from config.config import Config
+from services.RowHider import get_row_hider
+from services.SheetMetadataCache import get_sheet_metadata_cache
+from services.SheetsClientProvider import get_sheets_service
+from services.SheetRows import index_rows_by_id
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
@@ -21,24 +25,15 @@ class IGSpreadsheetController:
 
     # hanmdle initalization of Google Sheets service
     def _initialize_google_sheets_service(self):
-        """Initialize and return the Google Sheets service."""
-        print("Initializing Google Sheets service...")
-        config_dict = Config.as_dict()
-        scope = ["https://www.googleapis.com/auth/spreadsheets"]
-        creds = Credentials.from_service_account_info(config_dict, scopes=scope)
-        return build('sheets', 'v4', credentials=creds)
+        """Return this thread's cached Google Sheets service."""
+        return get_sheets_service()
     
     #handle sheet id values retrieval
     def _get_sheet_id(self, service, spreadsheet_id: str, tab_name: str) -> int:
         """Helper method to get sheetId from tab name"""
-        spreadsheet = service.spreadsheets().get(
-            spreadsheetId=spreadsheet_id,
-            fields='sheets.properties'
-        ).execute()
-        
-        for sheet in spreadsheet['sheets']:
-            if sheet['properties']['title'] == tab_name:
-                return sheet['properties']['sheetId']
+        sheet_id = get_sheet_metadata_cache().sheet_id(service, spreadsheet_id, tab_name)
+        if sheet_id is not None:
+            return sheet_id
         
         raise ValueError(f"Sheet '{tab_name}' not found in spreadsheet")
     
@@ -116,6 +111,7 @@ class IGSpreadsheetController:
 
         body = {"requests": requests}
         sheet.batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
+        get_sheet_metadata_cache().invalidate(spreadsheet_id)
         return date_col_index
     
     #handle sheet values retrieval
@@ -151,20 +147,6 @@ class IGSpreadsheetController:
         print(f"No value found in column E for the currency '{currency}'.")
         return None
     
-    #handle safe execution of update requests with retries
-    def safe_execute_update(self, func, retries=5, delay=2, backoff=2):
-        for attempt in range(retries):
-            try:
-                return func()  # get the request object
-                # return request.execute()  # execute here
-            except HttpError as e:
-                if e.resp.status == 429 and attempt < retries - 1:
-                    wait_time = delay * (backoff ** attempt)
-                    print(f"[429] Rate limit hit. Retrying in {wait_time:.2f} seconds...")
-                    time.sleep(wait_time)
-                else:
-                    raise
-
     #handle sheet values update
     def _update_sheet_values(self, service, spreadsheet_id, sheet_id, tab_name, 
                             today_str, currency_row_index, insights, total_followers, value_in_column_e):
@@ -197,10 +179,10 @@ class IGSpreadsheetController:
                 "values": all_values
             }
         ]
-        self.safe_execute_update(lambda: sheet.values().batchUpdate(
+        sheet.values().batchUpdate(
             spreadsheetId=spreadsheet_id,
             body={"valueInputOption": "RAW", "data": data}
-        ).execute())
+        ).execute()
 
         # Format date cell
         requests = [
@@ -245,10 +227,10 @@ class IGSpreadsheetController:
                 }
             }
         ]
-        self.safe_execute_update(lambda: service.spreadsheets().batchUpdate(
+        service.spreadsheets().batchUpdate(
             spreadsheetId=spreadsheet_id,
             body={"requests": requests}
-        ).execute())
+        ).execute()
 
 
         print(f"Updated values and formatted rows {currency_row_index-1} to {currency_row_index+15}")
@@ -312,11 +294,7 @@ class IGSpreadsheetController:
             service = self._initialize_google_sheets_service()
             sheet = service.spreadsheets()
 
-            metadata = sheet.get(spreadsheetId=spreadsheet_id).execute()
-            sheet_info = next(
-                s for s in metadata['sheets'] if s['properties']['title'] == tab_name
-            )
-            sheet_id = sheet_info['properties']['sheetId']
+            sheet_id = self._get_sheet_id(service, spreadsheet_id, tab_name)
 
             # Check how many rows are used based on column A
             result = sheet.values().get(
@@ -344,6 +322,7 @@ class IGSpreadsheetController:
             }
 
             sheet.batchUpdate(spreadsheetId=spreadsheet_id, body={'requests': [request]}).execute()
+            get_sheet_metadata_cache().invalidate(spreadsheet_id)
             print(f"🧹 Trimmed sheet '{tab_name}' to {new_row_count} rows")
             return True
 
@@ -351,6 +330,10 @@ class IGSpreadsheetController:
             print(f"🔴 Failed to trim: {str(e)}")
             return False
         
+    def _index_existing_rows(self, existing_rows: list, compare_date: str) -> dict:
+        """Instagram media rows of compare_date by the post_id in column S"""
+        return index_rows_by_id(existing_rows, compare_date, lambda row: row[18] if len(row) > 18 else None)
+
     def calculate_day_deltas(self, post_age, insights, existing_row):
         """
         Calculates reach, impressions, and reactions deltas for 3, 7, and 30 days.
@@ -419,68 +402,14 @@ class IGSpreadsheetController:
 
         return result
     
-    def safe_execute(self, request, retries=3, delay=5):
-        for attempt in range(retries):
-            try:
-                return request.execute()
-            except (ConnectionResetError, HttpError) as e:
-                wait = delay * (2 ** attempt)  # exponential backoff
-                print(f"[Retry {attempt + 1}] Error: {e}. Waiting {wait}s before retry...")
-                time.sleep(wait)
-        raise Exception("Google Sheets API call failed after multiple retries")
     
     def hide_old_rows(self, spreadsheet_id: str, tab_name: str):
         service = self._initialize_google_sheets_service()
-        sheet = service.spreadsheets()
-        
-        # Get all dates in Column Q (index 16, so range Q3 down)
-        result = sheet.values().get(
-            spreadsheetId=spreadsheet_id,
-            range=f"{tab_name}!Q3:Q",
-            majorDimension="COLUMNS"
-        ).execute()
-
-        values = result.get("values", [[]])[0]
         old_yesterday = (datetime.now().date() - timedelta(days=2))
 
-        rows_to_hide = []
-        for i, val in enumerate(values):
-            try:
-                row_date = datetime.strptime(val.strip(), "%Y-%m-%d").date()
-                if row_date <= old_yesterday:
-                    rows_to_hide.append(i + 2)  # index starts at 0, row 3 = index 0 + 2
-            except Exception:
-                continue
-
-        if not rows_to_hide:
-            print("ℹ️ No rows to hide.")
-            return
-
-        # Get the sheet ID
-        sheet_metadata = sheet.get(spreadsheetId=spreadsheet_id).execute()
-        sheet_id = next(
-            s["properties"]["sheetId"]
-            for s in sheet_metadata["sheets"]
-            if s["properties"]["title"] == tab_name
-        )
-
-        requests = [{
-            "updateDimensionProperties": {
-                "range": {
-                    "sheetId": sheet_id,
-                    "dimension": "ROWS",
-                    "startIndex": row,
-                    "endIndex": row + 1,
-                },
-                "properties": {"hiddenByUser": True},
-                "fields": "hiddenByUser",
-            }
-        } for row in rows_to_hide]
-
-        body = {"requests": requests}
-        sheet.batchUpdate(spreadsheetId=spreadsheet_id, body=body).execute()
-
-        print(f"✅ Hidden {len(rows_to_hide)} rows with date <= yesterday.")
+        # Only newly aged rows are read and hidden, in contiguous ranges
+        sheet_id = self._get_sheet_id(service, spreadsheet_id, tab_name)
+        get_row_hider().hide_aged_rows(service, spreadsheet_id, tab_name, sheet_id, old_yesterday)
 
     def transfer_insight_data(self, spreadsheet_id: str, tab_name: str, insights_data: list, followers: dict, date: str = None):
         try:
@@ -517,6 +446,7 @@ class IGSpreadsheetController:
                 range=f"{tab_name}!A3:S",
                 majorDimension="ROWS"
             ).execute().get('values', [])
+            existing_index = self._index_existing_rows(existing_rows, compare_date)
 
             # 3. Prepare today's data
             new_rows = []
@@ -545,20 +475,11 @@ class IGSpreadsheetController:
                     "react_7": '',
                     "react_30": ''
                 }
-                for row_index, row in enumerate(existing_rows):
-                    # Ensure row has at least 15 columns (to access P and Q)
-                    if len(row) >= 18:
-                        post_id = row[18]
-                        last_update_date = row[16]
-                        
-                        existing_post_id = post_id if post_id else ''
-                        if existing_post_id == incoming_post_id and last_update_date == compare_date:
-                            print(f"🔁 Matched Row {row_index + 3} (Updated on {last_update_date}): {row}")
-                            deltas = self.calculate_day_deltas(post_age, insights, row)
-                            # break
-                        # else:
-                            # print(f"❌ No match for Row {row_index + 3}") 
-                    # break
+                matched = existing_index.get(incoming_post_id)
+                if matched:
+                    row_number, row = matched
+                    print(f"🔁 Matched Row {row_number} (Updated on {compare_date}): {row}")
+                    deltas = self.calculate_day_deltas(post_age, insights, row)
 
                 # print(deltas)
                 if post_age == 3 and deltas['reach_3'] == '':
@@ -600,14 +521,13 @@ class IGSpreadsheetController:
                     row.append("")
 
             # 4. Get sheet ID
-            sheet_metadata = sheet.get(spreadsheetId=spreadsheet_id).execute()
-            sheet_id = next(s['properties']['sheetId'] 
-                    for s in sheet_metadata['sheets'] 
-                    if s['properties']['title'] == tab_name)
+            sheet_properties = get_sheet_metadata_cache().properties(service, spreadsheet_id, tab_name)
+            if sheet_properties is None:
+                raise ValueError(f"Sheet '{tab_name}' not found in spreadsheet")
+            sheet_id = sheet_properties['sheetId']
 
             # 🔧 Expand the sheet's column count if needed
-            sheet_properties = next(s for s in sheet_metadata['sheets'] if s['properties']['title'] == tab_name)
-            current_columns = sheet_properties['properties']['gridProperties'].get('columnCount', 0)
+            current_columns = sheet_properties['gridProperties'].get('columnCount', 0)
 
             if num_columns > current_columns:
                 print(f"📐 Expanding columns from {current_columns} → {num_columns}")
@@ -708,17 +628,14 @@ class IGSpreadsheetController:
                 spreadsheetId=spreadsheet_id,
                 body={'requests': requests}
             )
-            self.safe_execute(request)
+            request.execute()
+            get_sheet_metadata_cache().invalidate(spreadsheet_id)
 
             print(f"✅ Added {len(new_rows)} centered records for {yesterday}")
             return True
 
         except HttpError as e:
             print(f"🔴 Sheets API Error: {str(e)}")
-            if e.resp.status == 429:
-                print("⏳ Rate limited - waiting 60 seconds...")
-                time.sleep(60)
-                return self.transfer_insight_data(spreadsheet_id, tab_name, insights_data, followers, date)
             return False
         except Exception as e:
             print(f"🔴 Critical Failure: {str(e)}")
@@ -10,11 +10,13 @@ from datetime import date as dt
 from collections import defaultdict
 from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
+from services.HttpClient import get_http_client
 
 class TwitterController:
     """Controller for YOUTUBE API interactions."""
     def __init__(self, TWITTER_BASE_API_URL:str, key:str):
         self.base_url = TWITTER_BASE_API_URL
+        self.http = get_http_client()
         print("FacebookController initialized...")
         self.headers = {
             "x-rapidapi-key": key,
@@ -24,7 +26,7 @@ class TwitterController:
     def fetch_channel_insights(self, username):
         """Fetch channel insights for a given date range channel level."""
         params = {"screenname": username}
-        response = requests.get(self.base_url+"screenname.php", headers=self.headers, params=params)
+        response = self.http.get(self.base_url+"screenname.php", headers=self.headers, params=params)
         # user_data = response.json()
         try:
             user_data = response.json()
@@ -74,7 +76,7 @@ class TwitterController:
                 params["cursor"] = cursor
                 
             try:
-                response = requests.get(self.base_url+"timeline.php", headers=self.headers, params=params, timeout=10)
+                response = self.http.get(self.base_url+"timeline.php", headers=self.headers, params=params, timeout=10)
                 response.raise_for_status()
                 raw_data = response.json()
                 
@@ -131,7 +133,7 @@ class TwitterController:
                 params["cursor"] = cursor
 
             try:
-                response = requests.get(self.base_url + "timeline.php", headers=self.headers, params=params, timeout=10)
+                response = self.http.get(self.base_url + "timeline.php", headers=self.headers, params=params, timeout=10)
                 response.raise_for_status()
                 raw_data = response.json()
 
@@ -168,8 +170,9 @@ class TwitterController:
                 sleep(2)
 
             except Exception as e:
+                # None, not the partial list, so the run does not count as finished
                 print(f"\nError: {str(e)}")
-                break
+                return None
 
         # Save to JSON
         # try:
@@ -209,7 +212,7 @@ class TwitterController:
                 params["cursor"] = cursor
 
             try:
-                response = requests.get(self.base_url + "timeline.php", headers=self.headers, params=params, timeout=10)
+                response = self.http.get(self.base_url + "timeline.php", headers=self.headers, params=params, timeout=10)
                 response.raise_for_status()
                 raw_data = response.json()
 
@@ -2,34 +2,44 @@ import requests
 import json
 import re
 import time
-import pickle
 import os
 from datetime import datetime, timedelta, timezone
 from datetime import date as dt
 from collections import defaultdict
-from googleapiclient.discovery import build
-from google.auth.transport.requests import Request
+from services.HttpClient import get_http_client
+from services.AnalyticsRunner import get_analytics_runner
+from services.MetricStore import get_metric_store, iter_days
+from services.VideoCache import get_video_cache
+from services.YoutubeCredentialStore import get_youtube_credential_store
+
+# Channel metrics kept per day in the metric store
+CHANNEL_DAILY_METRICS = ["views", "engagedViews", "likes", "comments", "shares", "subscribersGained", "subscribersLost"]
+
+# Analytics rows arrive 2-3 days late; a day still without a row after this many days really had no data
+ANALYTICS_SETTLE_DAYS = int(os.getenv("YOUTUBE_ANALYTICS_SETTLE_DAYS", 7))
+
+# Video ids sent in one Analytics `video==` filter
+MAX_VIDEOS_PER_FILTER = 50
+
+# Milestones of the video sheet, in days after publishing
+VIDEO_MILESTONES = (3, 7, 30)
 
 class YoutubeController:
     """Controller for YOUTUBE API interactions."""
     def __init__(self, YOUTUBE_BASE_API_URL:str):
         self.base_url = YOUTUBE_BASE_API_URL
+        self.http = get_http_client()
+        # 3/7/30-day milestones from an Analytics day series instead of diffing the sheet
+        self.video_day_series = os.getenv("YOUTUBE_VIDEO_DAY_SERIES", "1") != "0"
         print("FacebookController initialized...")
 
-    # Load credentials from saved token
+    # Load credentials from saved token, kept fresh (and written back) by the shared credential store
     def load_credentials(self,token_filename):
-        token_path = os.path.join(os.path.dirname(__file__), "..", "tokens", token_filename)
-        token_path = os.path.abspath(token_path)
-
-        with open(token_path, "rb") as token_file:
-            creds = pickle.load(token_file)
-        if creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        return creds
+        return get_youtube_credential_store().credentials(token_filename)
 
     # Fetch channel insights for a given date range channel level
     def fetch_channel_insights(self, creds, label, start_date, end_date):
-        youtube_analytics = build("youtubeAnalytics", "v2", credentials=creds)
+        youtube_analytics = get_youtube_credential_store().service(creds, "analytics")
 
         response = youtube_analytics.reports().query(
             ids="channel==MINE",
@@ -71,10 +81,52 @@ class YoutubeController:
 
         return totals
 
+    # One day-dimension query covering every day of the year the metric store is missing
+    def sync_channel_days(self, creds, object_id, start_date, end_date):
+        store = get_metric_store()
+        missing = store.days_to_fetch(object_id, "yt_channel", start_date, end_date)
+        if not missing:
+            return
+        first, last = missing[0], missing[-1]
+        print(f"📊 Querying channel days {first} → {last} ({len(missing)} missing)")
+
+        youtube_analytics = get_youtube_credential_store().service(creds, "analytics")
+        response = youtube_analytics.reports().query(
+            ids="channel==MINE",
+            startDate=first.isoformat(),
+            endDate=last.isoformat(),
+            metrics=",".join(CHANNEL_DAILY_METRICS),
+            dimensions="day",
+            sort="day"
+        ).execute()
+
+        values = {metric: {} for metric in CHANNEL_DAILY_METRICS}
+        returned = set()
+        for row in response.get("rows", []):
+            returned.add(row[0])
+            for metric, value in zip(CHANNEL_DAILY_METRICS, row[1:]):
+                values[metric][row[0]] = value
+
+        # Days without a row are only covered once they are settled, late rows are asked for again until then
+        settled_before = end_date - timedelta(days=ANALYTICS_SETTLE_DAYS)
+        covered = [day for day in iter_days(first, last) if day.isoformat() in returned or day <= settled_before]
+        store.put_days(object_id, "yt_channel", values, covered)
+
+    # Channel totals for a date range, summed from the metric store
+    def channel_totals(self, object_id, label, start_date, end_date):
+        sums = get_metric_store().sum_days(object_id, CHANNEL_DAILY_METRICS, start_date, end_date)
+        return {
+            "label": label,
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            **sums,
+            "engagements": sums["likes"] + sums["comments"] + sums["shares"],
+        }
+
     #get channel info by username or handle
     def get_channel_info(self,handle,key=None):
         url = f"https://www.googleapis.com/youtube/v3/channels?part=id,snippet,statistics&forHandle={handle}&key={key}"
-        resp = requests.get(url).json()
+        resp = self.http.get(url).json()
         if "items" in resp and resp["items"]:
             data = resp["items"][0]
             return {
@@ -85,57 +137,156 @@ class YoutubeController:
             }
         return None
 
-    # Fetch all videos with insights for the authenticated user
-    def fetch_all_video_with_insights(self, creds):
-        youtube_data = build("youtube", "v3", credentials=creds)
-        youtube_analytics = build("youtubeAnalytics", "v2", credentials=creds)
+    # Uploads playlist of the authenticated channel (1 quota unit, search().list costs 100)
+    def _uploads_playlist(self, youtube_data):
+        res = youtube_data.channels().list(part="contentDetails", mine=True).execute()
+        items = res.get("items", [])
+        if not items:
+            return None
+        return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
-        # Step 1: Get all video IDs and metadata
-        print("📥 Fetching video metadata...")
-        all_videos = []
-        video_meta = {}
+    # Walk the uploads playlist (newest first) and stop after the page that reaches start_date
+    def _iter_recent_uploads(self, youtube_data, playlist_id, start_date):
         next_page_token = None
-
         while True:
-            res = youtube_data.search().list(
-                part="id",
-                forMine=True,
-                type="video",
+            res = youtube_data.playlistItems().list(
+                part="contentDetails",
+                playlistId=playlist_id,
                 maxResults=50,
                 pageToken=next_page_token
             ).execute()
 
-            video_ids = [item["id"]["videoId"] for item in res.get("items", [])]
-            all_videos.extend(video_ids)
-
-            if video_ids:
-                details = youtube_data.videos().list(
-                    part="snippet",
-                    id=",".join(video_ids)
-                ).execute()
-
-                for item in details.get("items", []):
-                    vid = item["id"]
-                    snippet = item["snippet"]
-                    published_date = snippet["publishedAt"].split("T")[0]
-                    video_meta[vid] = {
-                        "title": snippet["title"],
-                        "publishedAt": published_date,
-                        "url": f"https://www.youtube.com/watch?v={vid}"
-                    }
+            reached_start = False
+            for item in res.get("items", []):
+                details = item.get("contentDetails", {})
+                published = details.get("videoPublishedAt")
+                if published and datetime.fromisoformat(published.split("T")[0]).date() < start_date:
+                    reached_start = True
+                    continue
+                # Private and scheduled videos have no publish date here, their snippet decides
+                yield details["videoId"]
 
             next_page_token = res.get("nextPageToken")
-            if not next_page_token:
+            if reached_start or not next_page_token:
                 break
 
-        if not all_videos:
-            print("❌ No videos found.")
-            return
+    # Title and publish date per video, videos().list only for IDs not cached yet
+    def _video_metadata(self, youtube_data, playlist_id, video_ids):
+        cache = get_video_cache()
+        known = cache.known(playlist_id)
+        new_ids = [vid for vid in video_ids if vid not in known]
+
+        for i in range(0, len(new_ids), 50):
+            details = youtube_data.videos().list(
+                part="snippet",
+                id=",".join(new_ids[i:i+50])
+            ).execute()
+
+            for item in details.get("items", []):
+                vid = item["id"]
+                snippet = item["snippet"]
+                published_date = snippet["publishedAt"].split("T")[0]
+                known[vid] = {
+                    "title": snippet["title"],
+                    "publishedAt": published_date,
+                    "url": f"https://www.youtube.com/watch?v={vid}"
+                }
+
+        print(f"🗂️ {len(video_ids) - len(new_ids)} videos from cache, {len(new_ids)} looked up")
+        # Keep only the videos still in the window
+        video_meta = {vid: known[vid] for vid in video_ids if vid in known}
+        cache.save(playlist_id, video_meta)
+        return video_meta
+
+    # One Analytics query per chunk of video ids, run concurrently under the credential's limit, rows merged
+    def _query_video_chunks(self, creds, youtube_analytics, video_ids, strict=False, **query):
+        chunks = [video_ids[i:i+MAX_VIDEOS_PER_FILTER] for i in range(0, len(video_ids), MAX_VIDEOS_PER_FILTER)]
+        queries = [
+            youtube_analytics.reports().query(filters=f"video=={','.join(chunk)}", **query)
+            for chunk in chunks
+        ]
+        print(f"📊 Querying {len(video_ids)} videos in {len(chunks)} chunks...")
+
+        rows = []
+        failures = []
+        for chunk, response in zip(chunks, get_analytics_runner().run_all(creds, queries)):
+            if isinstance(response, Exception):
+                if strict:
+                    raise response
+                # The other chunks still count, only these videos are missing
+                print(f"⚠️ Analytics query failed for {len(chunk)} videos: {str(response)}")
+                failures.append(response)
+                continue
+            rows.extend(response.get("rows", []))
+        if failures and len(failures) == len(chunks):
+            # Nothing came back, that is a failed fetch and not a channel without views
+            raise failures[0]
+        return rows
+
+    # Per-video day rows (dimensions=video,day), a failed chunk fails the whole series
+    def fetch_video_day_series(self, creds, youtube_analytics, video_ids, start_date, end_date):
+        series = defaultdict(dict)
+        rows = self._query_video_chunks(
+            creds,
+            youtube_analytics,
+            video_ids,
+            strict=True,
+            ids="channel==MINE",
+            startDate=start_date.isoformat(),
+            endDate=end_date.isoformat(),
+            metrics="views,engagedViews,likes,comments,shares",
+            dimensions="video,day",
+            sort="day"
+        )
+
+        for video_id, day, views, engaged_views, likes, comments, shares in rows:
+            series[video_id][day] = {
+                "reach": engaged_views,
+                "impressions": views,
+                "reactions": likes + comments + shares
+            }
+        return series
+
+    # Milestone columns of the video sheet from a day series: the total at day 3, then the growth to day 7 and to day 30
+    @staticmethod
+    def video_milestones(days, published, last_day):
+        columns = {"reach": "reach", "imp": "impressions", "react": "reactions"}
+        result = {f"{column}_{milestone}": '' for column in columns for milestone in VIDEO_MILESTONES}
+        previous = {column: 0 for column in columns}
+
+        for milestone in VIDEO_MILESTONES:
+            cutoff = published + timedelta(days=milestone)
+            if cutoff > last_day:
+                break
+            for column, metric in columns.items():
+                total = sum(values[metric] for day, values in days.items() if day <= cutoff.isoformat())
+                result[f"{column}_{milestone}"] = str(max(total - previous[column], 0))
+                previous[column] = total
+        return result
+
+    # Fetch all videos with insights for the authenticated user
+    def fetch_all_video_with_insights(self, creds):
+        youtube_data = get_youtube_credential_store().service(creds, "data")
+        youtube_analytics = get_youtube_credential_store().service(creds, "analytics")
 
-        # Step 2: Filter videos published in the last 30 days
         end_date = dt.today()
         start_date = end_date - timedelta(days=30)
 
+        # Step 1: Get the recent video IDs from the uploads playlist, metadata only for new ones
+        print("📥 Fetching video metadata...")
+        playlist_id = self._uploads_playlist(youtube_data)
+        if not playlist_id:
+            print("❌ No uploads playlist found.")
+            return []
+
+        all_videos = list(self._iter_recent_uploads(youtube_data, playlist_id, start_date))
+        if not all_videos:
+            print("❌ No videos found.")
+            return []
+
+        video_meta = self._video_metadata(youtube_data, playlist_id, all_videos)
+
+        # Step 2: Filter videos published in the last 30 days
         recent_videos = [
             vid for vid in all_videos
             if datetime.fromisoformat(video_meta.get(vid, {}).get("publishedAt", "1900-01-01")).date() >= start_date
@@ -144,27 +295,26 @@ class YoutubeController:
 
         if not recent_videos:
             print("❌ No recent videos published in the last 30 days.")
-            return
+            return []
 
         print(f"✅ Found {len(recent_videos)} videos from the last 30 days.")
 
-        # Step 3: Fetch analytics
-        video_id_list = ",".join(recent_videos)
+        # Step 3: Fetch analytics, the video filter is split into chunks the API accepts
         print("📊 Fetching analytics data...")
-        response = youtube_analytics.reports().query(
+        rows = self._query_video_chunks(
+            creds,
+            youtube_analytics,
+            recent_videos,
             ids="channel==MINE",
             startDate=start_date.isoformat(),
             endDate=end_date.isoformat(),
             metrics="views,engagedViews,likes,comments,shares",
             dimensions="video",
-            filters=f"video=={video_id_list}",
             sort="-views"
-        ).execute()
-
-        rows = response.get("rows", [])
+        )
         if not rows:
             print("❌ No analytics data found.")
-            return
+            return []
 
         # Step 4: Sort by published date (latest to oldest)
         rows.sort(key=lambda r: video_meta.get(r[0], {}).get("publishedAt", "0000-00-00"), reverse=True)
@@ -199,6 +349,17 @@ class YoutubeController:
             
             video_insights.append(insight)
 
+        # Step 6: Milestones from the day series, the sheet falls back to diffing its rows without them
+        if self.video_day_series:
+            try:
+                series = self.fetch_video_day_series(creds, youtube_analytics, recent_videos, start_date, end_date)
+                last_day = end_date - timedelta(days=1)
+                for insight in video_insights:
+                    published = datetime.fromisoformat(insight["published_at"]).date()
+                    insight["milestones"] = self.video_milestones(series.get(insight["video_id"], {}), published, last_day)
+            except Exception as e:
+                print(f"⚠️ Video day series failed, milestones come from the sheet: {str(e)}")
+
         return video_insights
     
     # get IG page insights (Followers, Engagements, Impressions and Reach)
@@ -225,25 +386,32 @@ class YoutubeController:
         # monthly_insights = self.fetch_channel_insights(creds, "monthly", start_month, target_date)
         # yearly_insights = self.fetch_channel_insights(creds, "yearly", start_year, target_date)
 
-        # Fetch insights
-        daily_insights = self.fetch_channel_insights(creds, "daily", yesterday, yesterday1)
+        # Fetch insights, one query extends the stored days and every period is summed locally
+        object_id = f"youtube:{token}"
+        self.sync_channel_days(creds, object_id, start_year, yesterday)
+        daily_insights = self.channel_totals(object_id, "daily", yesterday, yesterday1)
         print("=====================================================================================")
         print("This is Daily Insights:")
         print(daily_insights)
         print("=====================================================================================")
-        monthly_insights = self.fetch_channel_insights(creds, "monthly", start_month, yesterday)
+        monthly_insights = self.channel_totals(object_id, "monthly", start_month, yesterday)
         print("=====================================================================================")
         print("This is Monhtly Insights:")
         print(monthly_insights)
         print("=====================================================================================")
-        yearly_insights = self.fetch_channel_insights(creds, "yearly", start_year, yesterday)
+        yearly_insights = self.channel_totals(object_id, "yearly", start_year, yesterday)
         print("=====================================================================================")
         print("This is Yearly Insights:")
         print(yearly_insights)
         print("=====================================================================================")
 
         #get all the videos with insights
-        video_insights = self.fetch_all_video_with_insights(creds)
+        # None marks a failed fetch, [] a channel without recent videos
+        try:
+            video_insights = self.fetch_all_video_with_insights(creds)
+        except Exception as e:
+            print(f"❌ Failed fetching video insights for {username}: {str(e)}")
+            video_insights = None
         print(f"[INFO] Successfully fetched YouTube metrics for Page: {username}")
 
         # Return as structured object
@@ -11,6 +11,7 @@ from googleapiclient.errors import HttpError
 from google.oauth2.service_account import Credentials
 from google.auth.transport.requests import AuthorizedSession
 from config.config import Config
+from services.SheetsClientProvider import get_sheets_client_provider, get_sheets_service
 from datetime import datetime, timedelta, timezone
 from typing import Optional, Tuple, Dict, List, TypedDict
 
@@ -22,46 +23,22 @@ class PlatformCell(TypedDict):
     value: str
 
 class ClientSheetController:
-    def __init__(self):
-        self._service = None
-        self._session = None
+    @property
+    def _service(self):
+        """This thread's cached Sheets service (httplib2 is not thread safe)"""
+        return get_sheets_service()
     
     def _initialize_google_sheets_service(self, retries: int = 3) -> bool:
-        """Initialize Google Sheets service with SSL context and retry logic"""
-        print("Initializing Google Sheets service with secure connection...")
-        config_dict = Config.as_dict()
-        scope = ["https://www.googleapis.com/auth/spreadsheets"]
-        
+        """Make sure the shared Sheets credentials and service are usable, with retry logic"""
         try:
-            # Create custom SSL context
-            ssl_context = ssl.create_default_context()
-            ssl_context.minimum_version = ssl.TLSVersion.TLSv1_2
-            
-            # Initialize credentials
-            creds = Credentials.from_service_account_info(
-                config_dict,
-                scopes=scope
-            )
-            
-            # Create authorized session with SSL context
-            self._session = AuthorizedSession(creds)
-            self._session.verify = ssl_context
-            
-            # Build service with custom session
-            self._service = build(
-                'sheets',
-                'v4',
-                credentials=creds,
-                static_discovery=False
-            )
-            
-            print("Google Sheets service initialized successfully")
+            get_sheets_service()
             return True
             
         except ssl.SSLError as e:
             print(f"SSL Error: {e}")
             if retries > 0:
                 print(f"Retrying... ({retries} attempts remaining)")
+                get_sheets_client_provider().reset()
                 return self._initialize_google_sheets_service(retries - 1)
             raise ConnectionError("Failed to establish secure connection after retries")
         except Exception as e:
@@ -168,6 +145,7 @@ class ClientSheetController:
         except HttpError as e:
             if e.resp.status == 401:  # Unauthorized
                 print("Reinitializing service after auth error...")
+                get_sheets_client_provider().reset()
                 self._initialize_google_sheets_service()
                 return self._safe_find_targets(spreadsheet_id, tab_name, config)
             print(f"API Error in {tab_name}: {e}")
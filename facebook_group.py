@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from typing import Dict, List, Optional, Union
 import re
+from services.HttpClient import get_http_client
 class FacebookGroupAnalyzer:
     def __init__(self, group_url: str, api_key: str, data_dir: str = "fb_group_data"):
         """
@@ -17,6 +18,7 @@ class FacebookGroupAnalyzer:
             data_dir: Directory to store cached data
         """
         self.group_url = group_url
+        self.http = get_http_client()
         self.headers = {
             "x-rapidapi-key": api_key,
             "x-rapidapi-host": "facebook-pages-scraper2.p.rapidapi.com"
@@ -73,7 +75,7 @@ class FacebookGroupAnalyzer:
         
         try:
             print("Fetching group details from API...")
-            response = requests.get(
+            response = self.http.get(
                 "https://facebook-pages-scraper2.p.rapidapi.com/get_facebook_group_details",
                 headers=self.headers,
                 params={"link": self.group_url, "timezone": "UTC"}
@@ -147,7 +149,7 @@ class FacebookGroupAnalyzer:
                     "end_cursor": end_cursor if end_cursor else ""
                 }
                 
-                response = requests.get(
+                response = self.http.get(
                     "https://facebook-pages-scraper2.p.rapidapi.com/get_facebook_group_posts_details",
                     headers=self.headers,
                     params=querystring
@@ -48,7 +48,7 @@ class ClientHelper:
             for platform, success in results.items():
                 print(f"{platform:20} {'✓' if success else '✗'}")
 
-            # return True
+            return True
         except Exception as e:
             print(f"Error in ClientHelper execution: {e}")
             return False
@@ -60,6 +60,7 @@ class FacebookHelper:
             pages_info_map = {page['page_id']: page for page in pages_info if 'page_id' in page}
 
             # Step 3: Process each IG ID group
+            all_transferred = True
             for page_id, insights in insights_by_page_id.items():
                 matched_info = pages_info_map.get(page_id)
                 if not matched_info:
@@ -80,16 +81,19 @@ class FacebookHelper:
                 spreadsheet_id = match.group(1)
                 print(f"\n🔄 Processing {len(insights)} insights for {BRAND} (Page {page_id})")
 
+                transferred = False
                 try:
                     # spreadsheet.transfer_insight_header_only(spreadsheet_id, CURRENCY, insights)
-                    spreadsheet.transfer_insight_data(spreadsheet_id, self.get_currency(CURRENCY, BRAND), insights, FOLLOWERS)
+                    transferred = spreadsheet.transfer_insight_data(spreadsheet_id, self.get_currency(CURRENCY, BRAND), insights, FOLLOWERS)
                     spreadsheet.hide_old_rows(spreadsheet_id, CURRENCY)
 
                     print(f"✅ Insight data transfer completed for {BRAND} (IG {page_id}) Followers: {FOLLOWERS}")
                 except Exception as e:
                     print(f"❌ Failed processing {BRAND} (IG {page_id}): {str(e)}")
+                # Hiding old rows is retried by the next run, only a failed transfer counts
+                all_transferred = all_transferred and bool(transferred)
 
-            return True
+            return all_transferred
 
         except Exception as e:
             print(f"❌ Unexpected error during processing: {str(e)}")
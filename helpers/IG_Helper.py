@@ -86,6 +86,7 @@ class IGHELPER:
             pages_info_map = {page['instagram_id']: page for page in pages_info if 'instagram_id' in page}
 
             # Step 3: Process each IG ID group
+            all_transferred = True
             for ig_id, insights in insights_by_ig_id.items():
                 matched_info = pages_info_map.get(ig_id)
                 if not matched_info:
@@ -106,16 +107,18 @@ class IGHELPER:
                 spreadsheet_id = match.group(1)
                 print(f"\n🔄 Processing {len(insights)} insights for {BRAND} (IG {ig_id})")
 
+                transferred = False
                 try:
                     # spreadsheet.transfer_insight_header_only(spreadsheet_id, CURRENCY, insights)
-                    spreadsheet.transfer_insight_data(spreadsheet_id, self.get_currency(CURRENCY, BRAND), insights, FOLLOWERS)
+                    transferred = spreadsheet.transfer_insight_data(spreadsheet_id, self.get_currency(CURRENCY, BRAND), insights, FOLLOWERS)
                     spreadsheet.hide_old_rows(spreadsheet_id, self.get_currency(CURRENCY, BRAND))
 
                     print(f"✅ Insight data transfer completed for {BRAND} (IG {ig_id}) Followers: {FOLLOWERS}")
                 except Exception as e:
                     print(f"❌ Failed processing {BRAND} (IG {ig_id}): {str(e)}")
+                all_transferred = all_transferred and bool(transferred)
 
-            return True
+            return all_transferred
 
         except Exception as e:
             print(f"❌ Unexpected error during processing: {str(e)}")
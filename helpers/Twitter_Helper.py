@@ -48,16 +48,17 @@ class TwitterHelper:
             spreadsheet_id = match.group(1)
             print(f"\n🔄 Processing {len(all_insights)} insights for {BRAND}")
             
+            transferred = False
             try:
                 # spreadsheet.transfer_insight_header_only(spreadsheet_id, CURRENCY, insights)
-                spreadsheet.transfer_timeline_insight_data(spreadsheet_id, CURRENCY, all_insights, FOLLOWERS)
+                transferred = spreadsheet.transfer_timeline_insight_data(spreadsheet_id, CURRENCY, all_insights, FOLLOWERS)
                 spreadsheet.hide_old_rows(spreadsheet_id, CURRENCY)
 
                 print(f"✅ Insight data transfer completed for {BRAND} Followers: {FOLLOWERS}")
             except Exception as e:
                 print(f"❌ Failed processing {BRAND}: {str(e)}")
 
-            return True
+            return bool(transferred)
 
         except Exception as e:
             print(f"❌ Unexpected error during processing: {str(e)}")
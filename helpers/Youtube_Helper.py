@@ -46,16 +46,17 @@ class YoutubeHelper:
             spreadsheet_id = match.group(1)
             print(f"\n🔄 Processing {len(all_insights)} insights for {BRAND} (Page {all_insights["channel"]["channel_id"]})")
             
+            transferred = False
             try:
                 # spreadsheet.transfer_insight_header_only(spreadsheet_id, CURRENCY, insights)
-                spreadsheet.transfer_video_insight_data(spreadsheet_id, CURRENCY, all_insights["video_insights"], FOLLOWERS)
+                transferred = spreadsheet.transfer_video_insight_data(spreadsheet_id, CURRENCY, all_insights["video_insights"], FOLLOWERS)
                 spreadsheet.hide_old_rows(spreadsheet_id, CURRENCY)
 
                 print(f"✅ Insight data transfer completed for {BRAND} (YOUTUBE {all_insights["channel"]["channel_id"]}) Followers: {FOLLOWERS}")
             except Exception as e:
                 print(f"❌ Failed processing {BRAND} (YOUTUBE {all_insights["channel"]["channel_id"]}): {str(e)}")
 
-            return True
+            return bool(transferred)
 
         except Exception as e:
             print(f"❌ Unexpected error during processing: {str(e)}")
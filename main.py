@@ -23,6 +23,10 @@ from helpers.Facebook_Helper import FacebookHelper
 from helpers.Youtube_Helper import YoutubeHelper
 from helpers.Twitter_Helper import TwitterHelper
 from helpers.Client_Helper import ClientHelper
+
+from services.ExecutionEngine import ExecutionEngine
+from services.Pipeline import Pipeline
+from services.RunJournal import RunJournal
 # Load environment variables
 load_dotenv()
 
@@ -87,6 +91,503 @@ def extract_sheet_id(url: str) -> str:
         return match.group(1)
     raise ValueError("Invalid Google Sheets URL")
 
+# Stateless, the Sheets service it uses is cached per thread by the client provider
+client_sheet = ClientSheetController()
+
+def write_sheet(engine, key, func, *args, **kwargs):
+    """Run a sheet write under the Sheets limit, one writer at a time per spreadsheet tab."""
+    with engine.serialized(key):
+        with engine.limit("sheets"):
+            return func(*args, **kwargs)
+
+def write_client_sheet(client_tab, target, data):
+    return ClientHelper()._process_data(client_tab, CLIENT_SHEET_ID, target, client_sheet, data)
+
+def unit_key(unit):
+    """account x page part of a journal unit id"""
+    if unit["type"] == "facebook_page":
+        return RunJournal.unit_id(unit["account"][0], unit["page"].get('id', 0))
+    return RunJournal.unit_id(unit["account"][0], unit["type"])
+
+def expected_stages(unit):
+    """Every sheet write stage a unit has to finish before it counts as done"""
+    if unit["type"] == "facebook_page":
+        stages = ["fb_gained", "fb_client", "fb_posts"]
+        if unit["page"].get('instagram_business_account'):
+            stages += ["ig_gained", "ig_client", "ig_posts"]
+        return stages
+    if unit["type"] == "youtube":
+        return ["yt_gained", "yt_client", "yt_videos"]
+    if unit["type"] == "twitter":
+        return ["tw_gained", "tw_client", "tw_timeline"]
+    return []
+
+def pending_stages(unit, journal):
+    """Stages of the unit the journal does not have as done yet"""
+    return [
+        stage for stage in expected_stages(unit)
+        if not journal.is_done(RunJournal.unit_id(unit_key(unit), stage))
+    ]
+
+# Post level stages that legitimately have nothing to write on quiet days
+POST_STAGES = {"fb_posts", "ig_posts", "yt_videos", "tw_timeline"}
+
+def post_stage_data(unit, stage):
+    """What the fetch returned for a post level stage: None when it failed, [] when there was nothing"""
+    results = unit.get("results") or {}
+    if stage == "fb_posts":
+        return results.get("facebook_insights")
+    if stage == "ig_posts":
+        return results.get("ig_insights")
+    if stage == "yt_videos":
+        return (results.get("chanel_insights") or {}).get("video_insights")
+    if stage == "tw_timeline":
+        return results.get("current_year_media")
+    return None
+
+# Fetches of a facebook_page unit and the stages that read them
+PAGE_FETCH_STAGES = {
+    "followers": {"fb_gained", "fb_client", "fb_posts"},
+    "ig_page_insights": {"ig_gained", "ig_client", "ig_posts"},
+    "ig_insights": {"ig_posts"},
+    "facebook_insights": {"fb_posts"},
+}
+
+def needs_fetch(pending, fetch):
+    """Whether any pending stage reads the given facebook_page fetch"""
+    return bool(PAGE_FETCH_STAGES[fetch].intersection(pending))
+
+def write_job(unit, stage, key, label, func, *args):
+    return {
+        "unit": RunJournal.unit_id(unit_key(unit), stage),
+        "stage": stage,
+        "key": key,
+        "label": label,
+        "func": func,
+        "args": args,
+    }
+
+def fetch_ig_post_insights(ig_Controller, page_token, start_date):
+    ig_posts_data = ig_Controller.fetch_all_ig_posts([page_token], start_date)
+    if ig_posts_data is None:
+        return None     # Listing failed, the stage stays pending for the next run
+    return ig_Controller.process_all_post_insights(ig_posts_data)
+
+def fetch_facebook_post_insights(facebookController, page_token, start_date, today_date):
+    posts_data = facebookController.fetch_all_posts_for_pages([page_token], start_date, today_date)
+    if posts_data is None:
+        return None     # Listing failed, the stage stays pending for the next run
+    return facebookController.process_all_pages_insights(posts_data)
+
+# STAGE 1: DISCOVER - expand an account into its units of work
+def discover_units(account, engine, pages_sp, journal):
+    # Verify if the account is active and token is valid
+    # print(f"Processing account: {account[0]} with name: {account[3]}")
+    # token_validator = FacebookTokenValidator(FACEBOOK_BASE_API_URL,account[6], account[7])
+    # token_info = token_validator.check_token_validity(account[4])
+    # print(f"Token info: {token_info}")
+    #end of token validation
+
+    if account[0].startswith("YT"):
+        return [{"type": "youtube", "account": account}]
+    print(f"Skipping YouTube processing for account: {account[0]}")
+
+    if account[0].startswith("TW"):
+        return [{"type": "twitter", "account": account}]
+    print(f"Skipping Twitter processing for account: {account[0]}")
+
+    if not account[0].startswith("FB"):
+        return []
+
+    facebookController = FacebookController(FACEBOOK_BASE_API_URL ,account)
+    ig_Controller = IGController(FACEBOOK_BASE_API_URL, account[4])
+
+    with engine.limit("graph"):
+        pages = facebookController.get_facebook_pages_with_instagram()
+
+    # get only badsha pages for this account ragi:
+    if account[5] == RAJI_ACCOUNT:
+        print(f"Processing account: {account[0]} with name: {account[3]} (RAJI ACCOUNT)")
+        pages['data'] = [page for page in pages.get('data', []) if page.get('name') == 'Badsha']
+
+    units = []
+    for page in pages.get('data', []):
+        page_id = page.get('id', 0)
+        # Match page_id to index 3
+        matched_info = next((item for item in pages_sp if item[3] == page_id), None)
+        if not matched_info:
+            print(f"Page ID: {page_id} not found in page_info_list.")
+            continue
+        units.append({
+            "type": "facebook_page",
+            "account": account,
+            "page": page,
+            "matched_info": matched_info,
+            "facebook": facebookController,
+            "instagram": ig_Controller,
+        })
+
+    # Followers and page level insights of all pages at once, fanned back out in fetch_unit.
+    # Only pages with work left are prefetched; if a prefetch fails fetch_unit asks per page.
+    todo = [(unit, pending_stages(unit, journal)) for unit in units]
+    with engine.limit("graph"):
+        try:
+            facebookController.prefetch_page_metrics([
+                (unit["page"].get('id'), unit["page"].get('access_token'))
+                for unit, pending in todo if needs_fetch(pending, "followers")
+            ])
+        except Exception as e:
+            print(f"⚠️ Page metrics prefetch failed for account {account[0]}, fetching per page: {str(e)}")
+        try:
+            ig_Controller.prefetch_ig_metrics([
+                (unit["page"]["instagram_business_account"]["id"], unit["page"].get('access_token'))
+                for unit, pending in todo
+                if unit["page"].get('instagram_business_account') and needs_fetch(pending, "ig_page_insights")
+            ])
+        except Exception as e:
+            print(f"⚠️ IG metrics prefetch failed for account {account[0]}, fetching per page: {str(e)}")
+    return units
+
+# STAGE 2: FETCH - all platform API calls of one unit
+def fetch_unit(unit, engine, journal, today_str):
+    account = unit["account"]
+
+    # Skip units a previous run for the same date already finished
+    pending = pending_stages(unit, journal)
+    if not pending:
+        print(f"⏭️ {unit_key(unit)} already done for {journal.run_date} - skipping")
+        return []
+    unit["pending_stages"] = pending
+
+    if unit["type"] == "facebook_page":
+        page = unit["page"]
+        page_id = page.get('id', 0)
+        page_access_token = page.get('access_token', 'xxxxxxxxxxxxx')
+        ig = page.get('instagram_business_account', False)
+        ig_id = ig.get('id', False) if ig else False
+        page_token = (
+            page_id,
+            page.get('access_token'),
+            page.get('instagram_business_account', {}).get('id')  # This could be None
+        )
+
+        # Get today’s date
+        today = datetime.now()
+        today_date = today.strftime('%Y-%m-%d')
+        # Set the start date to 30 days before today
+        start_date = (today - timedelta(days=31)).strftime('%Y-%m-%d')  # 29 to include today as the 30th day
+
+        facebookController = unit["facebook"]
+        ig_Controller = unit["instagram"]
+        # Only what the pending stages read; results of the others stay None
+        calls = {
+            "followers": (facebookController.get_facebook_page_metrics, page_id, page_access_token, today_str),
+            "ig_page_insights": (ig_Controller.get_ig_page_metrics, page_id, ig_id, page_access_token),
+            "ig_insights": (fetch_ig_post_insights, ig_Controller, page_token, start_date),
+            "facebook_insights": (fetch_facebook_post_insights, facebookController, page_token, start_date, today_date),
+        }
+        futures = {
+            fetch: engine.submit("graph", *call)
+            for fetch, call in calls.items() if needs_fetch(pending, fetch)
+        }
+        unit["results"] = dict.fromkeys(calls)
+        unit["results"].update(zip(futures.keys(), engine.gather(futures.values(), label=f"page {page_id}")))
+
+    elif unit["type"] == "youtube":
+        youtube_Controller = YoutubeController(YOUTUBE_BASE_API_URL)
+        with engine.limit("youtube"):
+            unit["results"] = {
+                "chanel_insights": youtube_Controller.get_youtube_page_metrics(account[3], account[4], account[8])
+            }
+
+    elif unit["type"] == "twitter":
+        twitter_Controller = TwitterController(TWITTER_BASE_API_URL, account[4])
+        with engine.limit("twitter"):
+            chanel_insights = twitter_Controller.fetch_channel_insights(account[3])
+            current_year_media = None
+            if chanel_insights:
+                # use this if the account is new to get the total
+                # current_year_media = twitter_Controller.get_current_year_media(account[3],rest_id)
+                current_year_media = twitter_Controller.get_current_month_media(account[3], chanel_insights['rest_id'])
+        unit["results"] = {
+            "chanel_insights": chanel_insights,
+            "current_year_media": current_year_media,
+            # Analyze metrics
+            "insights": twitter_Controller.analyze_current_year_metrics(current_year_media) if current_year_media else None,
+        }
+
+    return [unit]
+
+# STAGE 3: BUILD - pure mapping from fetched metrics to sheet write jobs
+def build_facebook_page_jobs(unit, sheets):
+    page = unit["page"]
+    matched_info = unit["matched_info"]
+    results = unit["results"]
+
+    page_id = page.get('id', 0)
+    page_access_token = page.get('access_token', 'xxxxxxxxxxxxx')
+    ig = page.get('instagram_business_account', False)
+    ig_id = ig.get('id', False) if ig else False
+
+    currency = matched_info[1]
+    brand = matched_info[2]
+    PAGE_TYPE = matched_info[4]
+    SPREAD_SHEET = matched_info[5]#facebook sheet
+    IG_SHEET = matched_info[6]
+    client_tab = f"{matched_info[2]} {matched_info[10]}"
+
+    followers = results["followers"] or {}
+    ig_page_insights = results["ig_page_insights"]
+    print(f"Page ID: {page_id}, Followers: {followers}, Currency: {currency}, Brand: {brand}, Page Type: {PAGE_TYPE}")
+
+    jobs = []
+    if ig_page_insights:
+        #processing ig page insights
+        jobs.append(write_job(
+            unit, "ig_gained", (IG_GAINED_SHEET_ID, brand), f"IG gained {brand} {currency}",
+            sheets["ig"].get_ig_spreadsheet_column,
+            IG_GAINED_SHEET_ID,brand,get_currency(currency,brand),ig_page_insights,ig_page_insights[0].get('followers_count', 0), PAGE_TYPE
+        ))
+
+        #update client sheet
+        # Access monthly insights safely
+        monthly = ig_page_insights[0].get('monthly_insights', {})
+        monthly_impressions = monthly.get('impressions', 0)
+        monthly_engagements = monthly.get('engagements', 0)
+        jobs.append(write_job(
+            unit, "ig_client", (CLIENT_SHEET_ID, client_tab), f"client {client_tab} INSTAGRAM",
+            write_client_sheet,
+            client_tab, "INSTAGRAM", [ig_page_insights[0].get('followers_count', 0), monthly_impressions, monthly_engagements]
+        ))
+
+    if "error" in followers or 'followers_count' not in followers:
+        # Not fetched, or the page insights did not come back; the page level stages stay pending
+        if followers:
+            print(f"❌ Page metrics failed for {brand}: {followers.get('error', 'no data')}")
+    else:
+        # get the target column and brand name
+        jobs.append(write_job(
+            unit, "fb_gained", (FB_GAINED_SHEET_ID, brand), f"FB gained {brand} {currency}",
+            sheets["fb"].get_spreadsheet_column,
+            FB_GAINED_SHEET_ID,brand,currency,followers,followers['followers_count'], PAGE_TYPE
+        ))
+
+        #update client sheet
+        jobs.append(write_job(
+            unit, "fb_client", (CLIENT_SHEET_ID, client_tab), f"client {client_tab} {matched_info[9]}",
+            write_client_sheet,
+            client_tab, matched_info[9], [followers['followers_count'], followers['page_impressions_monthly'], followers['page_post_engagements_monthly']]
+        ))
+
+    # Build the page info object
+    page_info = {
+        "page_id": page_id,
+        "instagram_id": ig_id,
+        "access_token": page_access_token,
+        "currency": currency,
+        "brand": brand,
+        "page_type": PAGE_TYPE,
+        "followers": followers,
+        "ig_followers": ig_page_insights[0].get('followers_count', 0) if ig_page_insights else 0,
+        "spreadsheet": SPREAD_SHEET,
+        "ig_spreadsheet": IG_SHEET
+    }
+
+    # # INSTAGRAM
+    if results["ig_insights"]:
+        # Send to ig helper to process insights
+        ig_helper = IGHELPER(results["ig_insights"])
+        sorted_data = ig_helper.get_sorted_posts(True)
+        jobs.append(write_job(
+            unit, "ig_posts", (IG_SHEET, currency), f"IG posts {brand} {currency}",
+            ig_helper.process_ig_insights_by_ig_id, sorted_data, [page_info], sheets["ig"]
+        ))
+
+    # # FACEBBOOK
+    # The post rows carry the followers count, without it the stage waits for the next run
+    if results["facebook_insights"] and 'followers_count' in followers:
+        #Send to facebook helper to process insights
+        facebook_helper = FacebookHelper(results["facebook_insights"])
+        sorted_data = facebook_helper.get_sorted_posts(True)
+        jobs.append(write_job(
+            unit, "fb_posts", (SPREAD_SHEET, currency), f"FB posts {brand} {currency}",
+            facebook_helper.process_facebook_insights_by_page_id, sorted_data, [page_info], sheets["fb"]
+        ))
+
+    return jobs
+
+def build_youtube_jobs(unit, pages_sp, sheets):
+    account = unit["account"]
+    chanel_insights = unit["results"]["chanel_insights"]
+    print(chanel_insights)
+    #mathe the code for youtube channel
+    matched_info = next((item for item in pages_sp if item[0] == account[0]), None)
+    #send it to designated sheet channel level
+    if not matched_info:
+        print(f"No matched info found for YouTube channel: {account[0]}")
+        return []
+
+    print(f"Matched info for YouTube channel: {matched_info}")
+    jobs = [write_job(
+        unit, "yt_gained", (YT_GAINED_SHEET_ID, matched_info[2]), f"YT gained {account[0]}",
+        sheets["yt"].get_youtube_spreadsheet_column,
+        YT_GAINED_SHEET_ID,matched_info[2],matched_info[1],chanel_insights,chanel_insights.get("channel", {}).get("subscribers", 0), matched_info[4]
+    )]
+
+    # Access safely using .get()
+    monthly_insights = chanel_insights.get('monthly_insights', {})
+    monthly_views = monthly_insights.get('views', 0)
+    monthly_engagements = monthly_insights.get('engagements', 0)
+
+    client_tab = f"{matched_info[2]} {matched_info[10]}"
+    jobs.append(write_job(
+        unit, "yt_client", (CLIENT_SHEET_ID, client_tab), f"client {client_tab} {matched_info[9]}",
+        write_client_sheet,
+        client_tab, matched_info[9], [chanel_insights.get("channel", {}).get("subscribers", 0), monthly_views, monthly_engagements]
+    ))
+
+    #process youtube posts insights
+    if chanel_insights and chanel_insights.get("video_insights"):
+        youtube_helper = YoutubeHelper(chanel_insights["video_insights"])
+        jobs.append(write_job(
+            unit, "yt_videos", (matched_info[7], matched_info[1]), f"YT videos {account[0]}",
+            youtube_helper.process_youtube_insights_by_page_id,
+            account[0], chanel_insights, matched_info, sheets["yt"]
+        ))
+    else:
+        print(f"⚠️ Skipping YouTube for {account[0]} — no valid video insights.")
+    return jobs
+
+def build_twitter_jobs(unit, pages_sp, sheets):
+    account = unit["account"]
+    chanel_insights = unit["results"]["chanel_insights"]
+    current_year_media = unit["results"]["current_year_media"]
+    insights = unit["results"]["insights"]
+    print(chanel_insights)
+    if not chanel_insights:
+        return []
+
+    #mathe the code for youtube channel
+    matched_info = next((item for item in pages_sp if item[0] == account[0]), None)
+    if not matched_info:
+        print(f"No matched info found for Twitter account: {account[0]}")
+        return []
+
+    if current_year_media is None:
+        # The media fetch failed, writing zeros would mark the day done; leave every stage pending
+        print(f"❌ Media fetch failed for Twitter account {account[0]}, retrying on the next run")
+        return []
+
+    if not current_year_media:
+        print("No current year media found.")
+        # Nothing posted in the window, the client row is not written on this path
+        unit["skipped_stages"] = {"tw_client": "no media"}
+        insights = {
+                "current_month": {
+                    "views": 0,
+                    "engagements": 0
+                }
+            }
+        return [write_job(
+            unit, "tw_gained", (TW_GAINED_SHEET_ID, matched_info[2]), f"TW gained {account[0]}",
+            sheets["tw"].get_twitter_spreadsheet_column,
+            TW_GAINED_SHEET_ID,matched_info[2],matched_info[1],insights,chanel_insights['followers_count'], matched_info[4]
+        )]
+
+    #send it to designated sheet channel level
+    if not (matched_info and insights):
+        print(f"No matched info found for YouTube channel: {account[0]}")
+        return []
+
+    print(f"Matched info for YouTube channel: {matched_info}")
+    jobs = [write_job(
+        unit, "tw_gained", (TW_GAINED_SHEET_ID, matched_info[2]), f"TW gained {account[0]}",
+        sheets["tw"].get_twitter_spreadsheet_column,
+        TW_GAINED_SHEET_ID,matched_info[2],matched_info[1],insights,chanel_insights['followers_count'], matched_info[4]
+    )]
+    # update client sheet with twitter monthly insights
+    # Access using get
+    current_month = insights.get('current_month', {})
+    views = current_month.get('views', 0)
+    engagements = current_month.get('engagements', 0)
+    brand_cur = 'DEFAULT'
+    if account[0] == "TW2":
+        print("its a badsha...")
+        brand_cur = f"{matched_info[1]} {matched_info[10]}"
+    else:
+        brand_cur = f"{matched_info[2]} {matched_info[10]}"
+
+    jobs.append(write_job(
+        unit, "tw_client", (CLIENT_SHEET_ID, brand_cur), f"client {brand_cur} {matched_info[9]}",
+        write_client_sheet,
+        brand_cur, matched_info[9], [chanel_insights['followers_count'], views, engagements]
+    ))
+    #process twitter posts insights
+    twitter_helper = TwitterHelper(current_year_media)
+    jobs.append(write_job(
+        unit, "tw_timeline", (matched_info[8], matched_info[1]), f"TW timeline {account[0]}",
+        twitter_helper.process_twitter_insights_by_page_id,
+        account[0], chanel_insights['followers_count'], current_year_media, matched_info, sheets["tw"]
+    ))
+
+    print("\nCurrent Year Insights:")
+    print(f"Total Posts: {insights['total']['posts']}")
+    print(f"Total Views: {insights['total']['views']}")
+    print(f"Total Engagements: {insights['total']['engagements']}")
+    print(f"Avg Views/Post: {insights['total']['avg_views']:.1f}")
+    print(f"Avg Engagements/Post: {insights['total']['avg_engagements']:.1f}")
+
+    print("\nCurrent Month Stats:")
+    print(json.dumps(insights['current_month'], indent=2))
+    return jobs
+
+def build_jobs(unit, pages_sp, sheets):
+    if unit["type"] == "facebook_page":
+        return build_facebook_page_jobs(unit, sheets)
+    if unit["type"] == "youtube":
+        return build_youtube_jobs(unit, pages_sp, sheets)
+    if unit["type"] == "twitter":
+        return build_twitter_jobs(unit, pages_sp, sheets)
+    return []
+
+def build_pending_jobs(unit, journal, pages_sp, sheets):
+    """Build the unit's write jobs, keeping only the stages still pending in the journal"""
+    pending = unit.get("pending_stages", expected_stages(unit))
+    jobs = [job for job in build_jobs(unit, pages_sp, sheets) if job["stage"] in pending]
+
+    # Stages without a job: done when there was nothing to write, failed when their fetch failed
+    built = {job["stage"] for job in jobs}
+    skipped = unit.get("skipped_stages", {})
+    for stage in pending:
+        if stage in built:
+            continue
+        stage_unit = RunJournal.unit_id(unit_key(unit), stage)
+        if stage in skipped:
+            journal.mark_done(stage_unit, skipped[stage])
+        elif stage in POST_STAGES:
+            data = post_stage_data(unit, stage)
+            if data is None:
+                journal.mark_failed(stage_unit, "fetch failed")
+            elif not data:
+                journal.mark_done(stage_unit, "no data")
+    return jobs
+
+# STAGE 4: WRITE - sheet writers
+def run_write_job(job, engine, journal):
+    print(f"✍️ Writing {job['label']}...")
+    try:
+        result = write_sheet(engine, job["key"], job["func"], *job["args"])
+    except Exception as e:
+        journal.mark_failed(job["unit"], str(e))
+        raise
+
+    # Sheet controllers report failures as None/False instead of raising
+    if result is None or result is False:
+        journal.mark_failed(job["unit"], "write returned no result")
+    else:
+        journal.mark_done(job["unit"])
+    return []
+
 def main():
     print("Begin the automation for followers gain....")
 
@@ -104,9 +605,6 @@ def main():
     ig_spreadsheet = IGSpreadsheetController(ACCOUNT_SHEET_ID, SPREADSHEET_RANGE)
     yt_spreadsheet = YoutubeSpreadsheetController(ACCOUNT_SHEET_ID, SPREADSHEET_RANGE)
     tw_spreadsheet = TwitterSpreadsheetController(ACCOUNT_SHEET_ID, SPREADSHEET_RANGE)
-    # Initialize client
-    client_sheet = ClientSheetController()
-    
     # # 1. Get your target rows (from your existing function)
     # target_rows = client_sheet.batch_find_targets(
     #     spreadsheet_id="1UsOJZzhQ71veg5oveCxoiIJCmyIdoQRXHrA7Qs276xE",
@@ -154,362 +652,37 @@ def main():
 
     accounts = spreadsheet.get_facebook_accounts()
     pages_sp = spreadsheet.get_facebook_pages()
-    
-    for account in accounts:
-        
-        # Verify if the account is active and token is valid
-        # print(f"Processing account: {account[0]} with name: {account[3]}")
-        # token_validator = FacebookTokenValidator(FACEBOOK_BASE_API_URL,account[6], account[7])
-        # token_info = token_validator.check_token_validity(account[4])
-        # print(f"Token info: {token_info}")
-        #end of token validation
-    
 
-        facebookController = FacebookController(FACEBOOK_BASE_API_URL ,account)
-        ig_Controller = IGController(FACEBOOK_BASE_API_URL)
-        youtube_Controller = YoutubeController(YOUTUBE_BASE_API_URL)
-        twitter_Controller = TwitterController(TWITTER_BASE_API_URL, account[4])
-        
-        client_helper = ClientHelper()
-
-        if account[0].startswith("FB"):
-            pages = facebookController.get_facebook_pages_with_instagram()
-            # print(pages)
-            pages_info = []  # Array of page info objects
-
-            # get only badsha pages for this account ragi:
-            if account[5] == RAJI_ACCOUNT:
-                print(f"Processing account: {account[0]} with name: {account[3]} (RAJI ACCOUNT)")
-                pages['data'] = [page for page in pages.get('data', []) if page.get('name') == 'Badsha']
-
-            for page in pages.get('data', []):
-                page_id = page.get('id', 0)
-                page_access_token = page.get('access_token', 'xxxxxxxxxxxxx')
-                ig = page.get('instagram_business_account', False)
-                ig_id = ig.get('id', False) if ig else False
-                # print(f"Page ID: {page_id}, Access Token: {page_access_token}, Instagram Business Account ID: {ig_id}")
-                
-                # Match page_id to index 3
-                matched_info = next((item for item in pages_sp if item[3] == page_id), None)
-
-                if matched_info:
-                    currency = matched_info[1]
-                    brand = matched_info[2]
-                    PAGE_TYPE = matched_info[4]
-                    SPREAD_SHEET = matched_info[5]#facebook sheet
-                    IG_SHEET = matched_info[6]
-
-                    # Extract spreadsheet ID
-                    followers = facebookController.get_facebook_page_metrics(page_id, page_access_token, today_str)
-                    print(f"Page ID: {page_id}, Followers: {followers}, Currency: {currency}, Brand: {brand}, Page Type: {PAGE_TYPE}")
-                    
-                    ig_page_insights = ig_Controller.get_ig_page_metrics(page_id,ig_id,page_access_token)
-                    if ig_page_insights:
-                        print("------------------------------------------------------------------------------")
-                        print(ig_page_insights)
-                        print("------------------------------------------------------------------------------")
-
-                        #processing ig page insights
-                        ig_spreadsheet.get_ig_spreadsheet_column(IG_GAINED_SHEET_ID,brand,get_currency(currency,brand),ig_page_insights,ig_page_insights[0].get('followers_count', 0), PAGE_TYPE)        
-
-                        #update client sheet
-                        # Access monthly insights safely
-                        monthly = ig_page_insights[0].get('monthly_insights', {})
-                        monthly_impressions = monthly.get('impressions', 0)
-                        monthly_engagements = monthly.get('engagements', 0)
-                        # TARGET = "INSTAGRAM"
-                        # if brand == 'BAJI' and matched_info[10] == 'BDT':
-                        #     print("Target")
-                        client_helper._process_data(
-                                f"{matched_info[2]} {matched_info[10]}", CLIENT_SHEET_ID, "INSTAGRAM", client_sheet, 
-                                [ig_page_insights[0].get('followers_count', 0), monthly_impressions, monthly_engagements]
-                            )
-                    
-                    # get the target column and brand name
-                    target_column = spreadsheet.get_spreadsheet_column(FB_GAINED_SHEET_ID,brand,currency,followers,followers['followers_count'], PAGE_TYPE)
-                    
-                    #update client sheet
-                    client_helper._process_data(
-                            f"{matched_info[2]} {matched_info[10]}", CLIENT_SHEET_ID, matched_info[9], client_sheet, 
-                            [followers['followers_count'], followers['page_impressions_monthly'], followers['page_post_engagements_monthly']]
-                        )
-                    
-                    # print(target_column)
-                    # Build the page info object
-                    page_info = {
-                        "page_id": page_id,
-                        "instagram_id": ig_id,
-                        "access_token": page_access_token,
-                        "currency": currency,
-                        "brand": brand,
-                        "page_type": PAGE_TYPE,
-                        "followers": followers,
-                        "ig_followers": ig_page_insights[0].get('followers_count', 0) if ig_page_insights else 0,
-                        "target_column": target_column,
-                        "spreadsheet": SPREAD_SHEET,
-                        "ig_spreadsheet": IG_SHEET
-                    }
-
-                    pages_info.append(page_info)
-
-                else:
-                    print(f"Page ID: {page_id} not found in page_info_list.")
-
-                # transfer it to designated spreadsheet
-
-        
-            # 1. Get all pages and their tokens
-            # page_tokens = [(page['id'], page['access_token']) for page in pages.get('data', [])]
-            page_tokens = [
-                (
-                    page['id'],
-                    page.get('access_token'),
-                    page.get('instagram_business_account', {}).get('id')  # This could be None
-                )
-                for page in pages.get('data', [])
-            ]
-
-            # 2. Fetch all posts (now with page tracking)
-            # # Get the current year and today’s date
-            # current_year = datetime.now().year
-            # today_date = datetime.now().strftime('%Y-%m-%d')
-            # # Set the starting date to January 1st of the current year
-            # start_date = f"{current_year}-01-01"
-            #new updates
-            # Get today’s date
-            today = datetime.now()
-            today_date = today.strftime('%Y-%m-%d')
-
-            # Set the start date to 30 days before today
-            start_date = (today - timedelta(days=31)).strftime('%Y-%m-%d')  # 29 to include today as the 30th day
-            
-
-            # # INSTAGRAM
-            ig_posts_data = ig_Controller.fetch_all_ig_posts(page_tokens, start_date)
-            print("This is IG POST...")
-            all_ig_insights = ig_Controller.process_all_post_insights(ig_posts_data)
-            # Send to ig helper to process insights
-            ig_helper = IGHELPER(all_ig_insights)
-            print("This is IG HELPER...")
-            sorted_data = ig_helper.get_sorted_posts(True)
-            ig_helper.process_ig_insights_by_ig_id(sorted_data, pages_info, ig_spreadsheet)
-
-
-
-            # # FACEBBOOK
-            posts_data = facebookController.fetch_all_posts_for_pages(page_tokens, start_date, today_date)
-            all_facebook_insights = facebookController.process_all_pages_insights(posts_data)
-            #Send to facebook helper to process insights
-            print("This is FACEBOOK HELPER...")
-            facebook_helper = FacebookHelper(all_facebook_insights)
-            sorted_data = facebook_helper.get_sorted_posts(True)
-            facebook_helper.process_facebook_insights_by_page_id(sorted_data, pages_info, spreadsheet)
-            # print(sorted_data)
-
-        #YOUTUBE
-        if account[0].startswith("YT"):
-            chanel_insights = youtube_Controller.get_youtube_page_metrics(account[3], account[4], account[8])
-            print(chanel_insights)
-            #mathe the code for youtube channel
-            matched_info = next((item for item in pages_sp if item[0] == account[0]), None)
-            #send it to designated sheet channel level
-            if matched_info:
-                print(f"Matched info for YouTube channel: {matched_info}")
-                yt_spreadsheet.get_youtube_spreadsheet_column(YT_GAINED_SHEET_ID,matched_info[2],matched_info[1],chanel_insights,chanel_insights.get("channel", {}).get("subscribers", 0), matched_info[4])
-                print(chanel_insights)
-
-                # Access safely using .get()
-                
-                monthly_insights = chanel_insights.get('monthly_insights', {})
-                monthly_views = monthly_insights.get('views', 0)
-                monthly_engagements = monthly_insights.get('engagements', 0)
-
-                client_helper._process_data(
-                            f"{matched_info[2]} {matched_info[10]}", CLIENT_SHEET_ID, matched_info[9], client_sheet, 
-                            [chanel_insights.get("channel", {}).get("subscribers", 0), monthly_views, monthly_engagements]
-                        )
-                
-                #process youtube posts insights
-                ## yt_spreadsheet.transfer_video_insight_data(extract_sheet_id(matched_info[7]), matched_info[1], chanel_insights.get("video_insights", []), chanel_insights.get("channel", {}).get("subscribers", 0))
-                if chanel_insights and isinstance(chanel_insights.get("video_insights"), list):
-                    youtube_helper = YoutubeHelper(chanel_insights["video_insights"])
-                    youtube_helper.process_youtube_insights_by_page_id(
-                        account[0], chanel_insights, matched_info, yt_spreadsheet
-                    )
-                else:
-                    print(f"⚠️ Skipping YouTube for {account[0]} — no valid video insights.")
-
-            else:
-                print(f"No matched info found for YouTube channel: {account[0]}")
-                continue
-        else:
-            print(f"Skipping YouTube processing for account: {account[0]}")
-
-        #FOR TWITTER
-        if account[0].startswith("TW"):
-            chanel_insights = twitter_Controller.fetch_channel_insights(account[3])
-            print(chanel_insights)
-            if chanel_insights:
-                rest_id = chanel_insights['rest_id']
-                # use this if the account is new to get the total
-                # current_year_media = twitter_Controller.get_current_year_media(account[3],rest_id)
-                current_year_media = twitter_Controller.get_current_month_media(account[3],rest_id)
-                #mathe the code for youtube channel
-                matched_info = next((item for item in pages_sp if item[0] == account[0]), None)
-
-                if current_year_media:
-                    # Analyze metrics
-                    insights = twitter_Controller.analyze_current_year_metrics(current_year_media)
-                    # print(insights)
-                    #Analyze 30days periods
-                    # recent_media = filter_media_last_30_days(current_year_media)
-
-                    
-                    #send it to designated sheet channel level
-                    if matched_info and insights:
-                        print(f"Matched info for YouTube channel: {matched_info}")
-                        user_data = tw_spreadsheet.get_twitter_spreadsheet_column(TW_GAINED_SHEET_ID,matched_info[2],matched_info[1],insights,chanel_insights['followers_count'], matched_info[4])
-                        # print(user_data)
-                        # update client sheet with twitter monthly insights
-                        # Access using get
-                        current_month = insights.get('current_month', {})
-                        views = current_month.get('views', 0)
-                        engagements = current_month.get('engagements', 0)
-                        brand_cur = 'DEFAULT'
-                        if account[0] == "TW2":
-                            print("its a badsha...")
-                            brand_cur = f"{matched_info[1]} {matched_info[10]}"
-                        else:
-                            brand_cur = f"{matched_info[2]} {matched_info[10]}"
-
-                        
-                        client_helper._process_data(
-                            brand_cur, CLIENT_SHEET_ID, matched_info[9], client_sheet, 
-                            [chanel_insights['followers_count'], views, engagements]
-                        )
-                        #process twitter posts insights
-                        twitter_helper = TwitterHelper(current_year_media)
-                        twitter_helper.process_twitter_insights_by_page_id(
-                            account[0], chanel_insights['followers_count'], current_year_media, matched_info, tw_spreadsheet
-                        )
-                    else:
-                        print(f"No matched info found for YouTube channel: {account[0]}")
-                        continue
-
-                    print("\nCurrent Year Insights:")
-                    print(f"Total Posts: {insights['total']['posts']}")
-                    print(f"Total Views: {insights['total']['views']}")
-                    print(f"Total Engagements: {insights['total']['engagements']}")
-                    print(f"Avg Views/Post: {insights['total']['avg_views']:.1f}")
-                    print(f"Avg Engagements/Post: {insights['total']['avg_engagements']:.1f}")
-                    
-                    # print("\nMonthly Breakdown:")
-                    # for month, stats in insights['monthly'].items():
-                    #     print(f"{month}: {stats['posts']} posts, {stats['views']} views")
-                    
-                    print("\nCurrent Month Stats:")
-                    print(json.dumps(insights['current_month'], indent=2))
-                
-                else:
-                    print("No current year media found.")
-                    insights = {
-                            "current_month": {
-                                "views": 0,
-                                "engagements": 0
-                            }
-                        }
-                    tw_spreadsheet.get_twitter_spreadsheet_column(TW_GAINED_SHEET_ID,matched_info[2],matched_info[1],insights,chanel_insights['followers_count'], matched_info[4])
-
-            
-        else:
-            print(f"Skipping YouTube processing for account: {account[0]}")
-
-
-
-
-
-        ## OLD VERSION OF THE CODE
-        # #commented for now for ig development
-        # # 3. Process insights for ALL pages while maintaining associations
-        # all_insights = facebookController.process_all_pages_insights(posts_data)
-        # # print(all_insights)
-        
-        # # Sort all_insights by created_time in descending order (newest first)
-        # all_insights.sort(
-        #     key=lambda x: datetime.strptime(x['created_time'], '%Y-%m-%dT%H:%M:%S%z'),
-        #     reverse=True
-        # )
-        # # Sort all_insights by created_time in ascending order (oldest first)
-        # # all_insights.sort(
-        # #     key=lambda x: datetime.strptime(x['created_time'], '%Y-%m-%dT%H:%M:%S%z')
-        # # )
-        
-        # # Group all insights by page_id
-        # insights_by_page = defaultdict(list)
-        # for insight in all_insights:
-        #     page_id = insight['source_page_id']
-        #     insights_by_page[page_id].append(insight)
-
-        # # Convert pages_info to a dict for fast lookup
-        # pages_info_map = {page['page_id']: page for page in pages_info}
-
-        # # Now process each page_id group
-        # for page_id, insights in insights_by_page.items():
-        #     # matched_info = next((item for item in pages_sp if item[3] == page_id), None)
-        #     # if not matched_info:
-        #     #     print(f"Page ID {page_id} not found in pages list")
-        #     #     continue
-
-        #     # CURRENCY = matched_info[1]
-        #     # BRAND = matched_info[2]
-        #     # PAGE_TYPE = matched_info[4]
-        #     # SPREAD_SHEET = matched_info[5]
-        #     # Get the page info from the map
-        #     matched_info = pages_info_map.get(page_id)
-        #     if not matched_info:
-        #         print(f"Page ID {page_id} not found in pages list")
-        #         continue
-
-        #     CURRENCY = matched_info["currency"]
-        #     BRAND = matched_info["brand"]
-        #     PAGE_TYPE = matched_info["page_type"]
-        #     FOLLOWERS = matched_info["followers"]
-        #     SPREAD_SHEET = matched_info["spreadsheet"]
-
-        #     # Extract spreadsheet ID
-        #     match = re.search(r"/d/([a-zA-Z0-9-_]+)", SPREAD_SHEET)
-        #     if not match:
-        #         print(f"Invalid spreadsheet URL for {BRAND}")
-        #         continue
-        #     spreadsheet_id = match.group(1)
-
-        #     print(f"\n🔄 Processing {len(insights)} insights for {BRAND} (page {page_id})")
-
-        #     try:
-        #         # Step 1: Ensure headers exist (handles inserting post_id headers)
-        #         # spreadsheet.transfer_insight_header_only(spreadsheet_id, CURRENCY, insights)
-        #         # print(f"✅ Header transfer completed for {BRAND} (page {page_id})")
-
-        #         # Step 2: Transfer ALL insights in one call (unified row 4 update)
-        #         spreadsheet.transfer_insight_data(spreadsheet_id, CURRENCY, insights, FOLLOWERS)
-        #         print(f"✅ Insight data transfer completed for {BRAND} (page {page_id}) Folowers: {FOLLOWERS}")
-
-        #         spreadsheet.hide_old_rows(spreadsheet_id, CURRENCY)
-        #         print(f"✅ OLD ROWS HIDDEN {BRAND} (page {page_id}) Folowers: {FOLLOWERS}")
-        #     except Exception as e:
-        #         print(f"❌ Failed processing {BRAND} (page {page_id}): {str(e)}")
-
-        # # # Define the folder and create it if it doesn't exist
-        # output_folder = "insight_results"
-        # os.makedirs(output_folder, exist_ok=True)
-
-        # # Use the current timestamp or date to make the filename unique
-        # filename = f"insights_{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
-        # file_path = os.path.join(output_folder, filename)
-        # # Save the data as JSON
-        # with open(file_path, 'w', encoding='utf-8') as f:
-        #     json.dump(all_insights, f, ensure_ascii=False, indent=4)
+    sheets = {
+        "fb": spreadsheet,
+        "ig": ig_spreadsheet,
+        "yt": yt_spreadsheet,
+        "tw": tw_spreadsheet,
+    }
+
+    # Run the daily job as a pipeline so Meta/YouTube/Twitter fetches overlap
+    # with Google Sheets writes. Every queue is bounded, so when the writers
+    # fall behind the fetchers wait instead of piling results up in memory.
+    engine = ExecutionEngine.from_env()
+    # Rerunning the same date only redoes units that did not finish
+    journal = RunJournal(today_str, os.getenv("RUN_JOURNAL_DIR", "run_journal"))
+    queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", 16))
+    pipeline = Pipeline("daily-run")
+    pipeline.add_stage("discover", lambda account: discover_units(account, engine, pages_sp, journal),
+                       workers=int(os.getenv("MAX_CONCURRENT_ACCOUNTS", 4)), queue_size=queue_size)
+    pipeline.add_stage("fetch", lambda unit: fetch_unit(unit, engine, journal, today_str),
+                       workers=int(os.getenv("PIPELINE_FETCH_WORKERS", 8)), queue_size=queue_size)
+    pipeline.add_stage("build", lambda unit: build_pending_jobs(unit, journal, pages_sp, sheets),
+                       workers=1, queue_size=queue_size)
+    pipeline.add_stage("write", lambda job: run_write_job(job, engine, journal),
+                       workers=engine.limits["sheets"], queue_size=queue_size)
+    try:
+        pipeline.run(accounts or [])
+    finally:
+        engine.shutdown()
 
+    summary = journal.summary()
+    print(f"📒 Journal {journal.path}: {summary['done']} units done, {summary['failed']} failed")
 
     print("Facebook Automation completed:")
 
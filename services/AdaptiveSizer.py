@@ -0,0 +1,144 @@
+import os
+import threading
+from typing import Dict, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from services.StateStore import StateStore
+
+# (smallest, largest) size per endpoint; the largest is also where an endpoint starts
+DEFAULT_LIMITS = {
+    "graph_batch": (5, 50),   # items per Graph batch POST
+    "fb_posts": (10, 100),    # /{page_id}/posts page size
+    "ig_media": (10, 100),    # /{ig_id}/media page size
+}
+
+
+def asks_for_less(error) -> bool:
+    """
+    True for errors that a smaller request would avoid: timeouts and Graph
+    code 1 "Please reduce the amount of data you're asking for". Dropped
+    connections say nothing about the size and are left to the retries.
+    """
+    # ConnectTimeout is a ConnectionError too, only read timeouts count
+    if isinstance(error, requests.exceptions.Timeout) and not isinstance(error, requests.exceptions.ConnectionError):
+        return True
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    try:
+        graph_error = response.json().get("error", {})
+    except ValueError:
+        return False
+    return graph_error.get("code") == 1 or "reduce the amount of data" in graph_error.get("message", "")
+
+
+def with_query(url: str, **params) -> str:
+    """Same URL with the given query parameters set (replacing any existing values)"""
+    parts = urlsplit(url)
+    query = [(key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True) if key not in params]
+    query.extend((key, str(value)) for key, value in params.items())
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def with_limit(url: str, limit: int) -> str:
+    """Same URL with its `limit` query parameter set, used to resize paging.next links"""
+    return with_query(url, limit=limit)
+
+
+class AdaptiveSizer:
+    """
+    Learns how much to ask for per request, per endpoint.
+
+    Sizes grow by a tenth after every fast response and are cut in half on
+    a timeout or a "reduce the amount of data" error (a quarter off for slow
+    responses). A failure also sets a ceiling just below the size that
+    failed; growth stops there and the ceiling is only raised by one after
+    `probe_after` fast responses in a row, so each endpoint settles just
+    under the size Meta starts rejecting instead of failing on every climb.
+    Sizes and ceilings are kept in a state file so the next run starts
+    where this one ended instead of failing its way down again.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, int]] = None, fast_seconds: float = 2, slow_seconds: float = 10,
+                 probe_after: int = 10):
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.fast_seconds = fast_seconds
+        self.slow_seconds = slow_seconds
+        self.probe_after = probe_after
+        self.state = StateStore("adaptive_sizes")
+        self._streaks = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            fast_seconds=float(os.getenv("GRAPH_FAST_RESPONSE_SECONDS", 2)),
+            slow_seconds=float(os.getenv("GRAPH_SLOW_RESPONSE_SECONDS", 10)),
+        )
+
+    def size(self, endpoint: str) -> int:
+        smallest, largest = self.limits[endpoint]
+        return max(smallest, min(largest, int(self.state.get(endpoint, largest))))
+
+    def _ceiling(self, endpoint: str) -> int:
+        smallest, largest = self.limits[endpoint]
+        return max(smallest, min(largest, int(self.state.get(f"{endpoint}:ceiling", largest))))
+
+    def _resize(self, endpoint: str, new_size: int) -> bool:
+        smallest = self.limits[endpoint][0]
+        with self._lock:
+            current = self.size(endpoint)
+            new_size = max(smallest, min(self._ceiling(endpoint), new_size))
+            if new_size == current:
+                return False
+            self.state.set(endpoint, new_size)
+        print(f"📐 {endpoint} size {current} -> {new_size}")
+        return True
+
+    def observe(self, endpoint: str, seconds: float):
+        """Grow after a fast response, back off after a slow one"""
+        current = self.size(endpoint)
+        if seconds >= self.slow_seconds:
+            self._streaks[endpoint] = 0
+            self._resize(endpoint, int(current * 0.75))
+        elif seconds <= self.fast_seconds:
+            ceiling = self._ceiling(endpoint)
+            if current >= ceiling and ceiling < self.limits[endpoint][1]:
+                # Probe one step above the ceiling once it has held for a while
+                self._streaks[endpoint] = self._streaks.get(endpoint, 0) + 1
+                if self._streaks[endpoint] < self.probe_after:
+                    return
+                self._streaks[endpoint] = 0
+                self.state.set(f"{endpoint}:ceiling", ceiling + 1)
+            self._resize(endpoint, current + max(1, current // 10))
+
+    def shrink(self, endpoint: str, failed_size: int) -> bool:
+        """
+        Halve the size that failed, False when that cannot make requests any
+        smaller. Requests sent concurrently at the old size may fail after
+        the size was already cut, so they do not cut it again.
+        """
+        smallest = self.limits[endpoint][0]
+        if failed_size <= smallest:
+            return False
+        self._streaks[endpoint] = 0
+        self.state.set(f"{endpoint}:ceiling", min(self._ceiling(endpoint), max(smallest, failed_size - 1)))
+        if self.size(endpoint) <= failed_size // 2:
+            return True
+        self._resize(endpoint, failed_size // 2)
+        return True
+
+
+_shared_sizer = None
+_shared_lock = threading.Lock()
+
+
+def get_adaptive_sizer() -> AdaptiveSizer:
+    global _shared_sizer
+    if _shared_sizer is None:
+        with _shared_lock:
+            if _shared_sizer is None:
+                _shared_sizer = AdaptiveSizer.from_env()
+    return _shared_sizer
@@ -0,0 +1,94 @@
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List
+
+import google_auth_httplib2
+from googleapiclient.http import build_http
+
+
+class AnalyticsRunner:
+    """
+    Executes prepared YouTube API requests (e.g. the chunks of one Analytics
+    query) concurrently.
+
+    At most `inflight_per_credential` requests of the same credentials are
+    open at once, so one large channel cannot use up the quota of its
+    project in a burst, while requests of other channels run next to them.
+    httplib2 connections are not thread safe, so every pool thread executes
+    with its own authorized transport per credential.
+    """
+
+    def __init__(self, inflight_per_credential: int = 3, max_workers: int = 6):
+        self.inflight_per_credential = max(1, inflight_per_credential)
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="yt-analytics")
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(self.inflight_per_credential))
+        self._slots_lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            inflight_per_credential=int(os.getenv("YOUTUBE_ANALYTICS_INFLIGHT_PER_CREDENTIAL", 3)),
+            max_workers=int(os.getenv("YOUTUBE_ANALYTICS_WORKERS", 6)),
+        )
+
+    @staticmethod
+    def _key(creds):
+        # The refresh token names the grant; the same channel loaded twice shares its slots
+        return getattr(creds, "refresh_token", None) or id(creds)
+
+    def _slot(self, creds) -> threading.BoundedSemaphore:
+        with self._slots_lock:
+            return self._slots[self._key(creds)]
+
+    def _http(self, creds):
+        transports = getattr(self._local, "transports", None)
+        if transports is None:
+            transports = self._local.transports = {}
+        key = self._key(creds)
+        http = transports.get(key)
+        if http is None or http.credentials is not creds:
+            http = transports[key] = google_auth_httplib2.AuthorizedHttp(creds, http=build_http())
+        return http
+
+    def _execute(self, creds, request, slot):
+        try:
+            return request.execute(http=self._http(creds))
+        finally:
+            slot.release()
+
+    def submit(self, creds, request) -> Future:
+        """Queue one request, waiting here while the credential has no free slot"""
+        slot = self._slot(creds)
+        slot.acquire()
+        try:
+            return self._pool.submit(self._execute, creds, request, slot)
+        except Exception:
+            slot.release()
+            raise
+
+    def run_all(self, creds, requests: list) -> List:
+        """Responses in the order given; a request that failed comes back as its exception"""
+        futures = [self.submit(creds, request) for request in requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
+
+
+_shared_runner = None
+_shared_lock = threading.Lock()
+
+
+def get_analytics_runner() -> AnalyticsRunner:
+    global _shared_runner
+    if _shared_runner is None:
+        with _shared_lock:
+            if _shared_runner is None:
+                _shared_runner = AnalyticsRunner.from_env()
+    return _shared_runner
@@ -0,0 +1,88 @@
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, Hashable, Iterable, List, Optional
+
+# Default number of calls allowed in flight at once for each upstream API
+DEFAULT_PLATFORM_LIMITS = {
+    "graph": 8,     # graph.facebook.com (Facebook + Instagram)
+    "youtube": 2,   # YouTube Data / Analytics
+    "twitter": 1,   # RapidAPI twitter-api45 (strict plan quota)
+    "sheets": 3,    # Google Sheets
+}
+
+
+class ExecutionEngine:
+    """
+    Concurrency limits shared by the stages of the daily pipeline.
+
+    The pipeline's stage workers call into the engine: limit() caps the
+    calls in flight per upstream API, serialized() keeps writers of the same
+    sheet tab apart, and submit()/gather() run a unit's independent API calls
+    side by side on a bounded task pool. Leaf tasks never submit further
+    work, so a stage worker waiting on them cannot starve that pool.
+    """
+
+    def __init__(self, max_workers: int = 16, limits: Optional[Dict[str, int]] = None):
+        self.limits = {**DEFAULT_PLATFORM_LIMITS, **(limits or {})}
+        self._semaphores = {
+            platform: threading.BoundedSemaphore(max(1, limit))
+            for platform, limit in self.limits.items()
+        }
+        self._task_pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="task")
+        self._key_locks = defaultdict(threading.Lock)
+        self._key_locks_guard = threading.Lock()
+        print(f"ExecutionEngine initialized (workers={max_workers}, limits={self.limits})")
+
+    @classmethod
+    def from_env(cls):
+        """Build an engine from the optional *_CONCURRENCY settings in .env"""
+        limits = {
+            platform: int(os.getenv(f"{platform.upper()}_CONCURRENCY", default))
+            for platform, default in DEFAULT_PLATFORM_LIMITS.items()
+        }
+        return cls(
+            max_workers=int(os.getenv("MAX_WORKERS", 16)),
+            limits=limits,
+        )
+
+    @contextmanager
+    def limit(self, platform: str):
+        """Hold one of the concurrency slots of the given platform"""
+        semaphore = self._semaphores.get(platform)
+        if semaphore is None:
+            yield
+            return
+        with semaphore:
+            yield
+
+    @contextmanager
+    def serialized(self, key: Hashable):
+        """Run one caller at a time for the given key (e.g. a spreadsheet tab)"""
+        with self._key_locks_guard:
+            lock = self._key_locks[key]
+        with lock:
+            yield
+
+    def submit(self, platform: str, func: Callable, *args, **kwargs):
+        """Schedule a leaf task that runs under the platform's concurrency limit"""
+        def run():
+            with self.limit(platform):
+                return func(*args, **kwargs)
+        return self._task_pool.submit(run)
+
+    def gather(self, futures: Iterable, label: str = "task") -> List:
+        """Wait for futures in submission order; failed tasks come back as None"""
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"❌ {label} failed: {str(e)}")
+                results.append(None)
+        return results
+
+    def shutdown(self):
+        self._task_pool.shutdown(wait=True)
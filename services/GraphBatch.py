@@ -0,0 +1,311 @@
+import json
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+import requests
+
+from services.AdaptiveSizer import AdaptiveSizer, asks_for_less, get_adaptive_sizer
+from services.GraphRateGovernor import THROTTLE_ERROR_CODES
+from services.HttpClient import get_http_client
+
+# Items Graph accepts in one batch POST
+MAX_BATCH_SIZE = 50
+
+# Item statuses and Graph error codes worth asking again (1/2 unknown and service errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_ERROR_CODES = THROTTLE_ERROR_CODES | {1, 2}
+
+
+def item_error(response: Optional[dict]) -> dict:
+    """The Graph error object of one batch item response, {} when there is none"""
+    if not response:
+        return {}
+    try:
+        body = json.loads(response.get('body') or '{}')
+    except (TypeError, ValueError):
+        return {}
+    return body.get('error', {}) if isinstance(body, dict) else {}
+
+
+def is_retryable(response: Optional[dict]) -> bool:
+    """
+    True when a batch item did not produce an answer we can use yet: Graph
+    returns null for items it gave up on, and throttling or server errors
+    come back as item level status codes inside an otherwise fine POST.
+    """
+    if response is None:
+        return True
+    if response.get('code') == 200:
+        return False
+    error = item_error(response)
+    return (
+        response.get('code') in RETRY_STATUSES
+        or error.get('code') in RETRY_ERROR_CODES
+        or bool(error.get('is_transient'))
+    )
+
+
+def is_retryable_failure(error) -> bool:
+    """
+    True when a whole batch POST failed for a reason worth asking again:
+    timeouts, dropped connections, throttling and server errors. Other 4xx
+    answers (a bad token, an invalid batch) fail the same way every time.
+    """
+    if isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError)):
+        return True
+    response = getattr(error, "response", None)
+    if response is None:
+        return False
+    if response.status_code in RETRY_STATUSES:
+        return True
+    try:
+        graph_error = response.json().get('error', {})
+    except ValueError:
+        return False
+    return graph_error.get('code') in RETRY_ERROR_CODES or bool(graph_error.get('is_transient'))
+
+
+class GraphBatchRunner:
+    """
+    Sends Graph batch POSTs concurrently instead of one after another.
+
+    Graph throttles per access token, so at most `inflight_per_token`
+    batches of the same token are open at once while batches of other
+    tokens run next to them. A slot is taken before a batch is handed to
+    the pool and given back when its POST finishes, so pool threads never
+    sit waiting on a busy token.
+    """
+
+    def __init__(self, inflight_per_token: int = 3, max_workers: int = 8, timeout: float = 60):
+        self.inflight_per_token = max(1, inflight_per_token)
+        self.timeout = timeout
+        self.http = get_http_client()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="graph-batch")
+        self._slots = defaultdict(lambda: threading.BoundedSemaphore(self.inflight_per_token))
+        self._slots_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            inflight_per_token=int(os.getenv("GRAPH_BATCH_INFLIGHT_PER_TOKEN", 3)),
+            max_workers=int(os.getenv("GRAPH_BATCH_WORKERS", 8)),
+        )
+
+    def _slot(self, token: str) -> threading.BoundedSemaphore:
+        with self._slots_lock:
+            return self._slots[token]
+
+    def _post(self, base_url: str, token: str, items: list) -> Tuple[list, float]:
+        started = time.monotonic()
+        response = self.http.post(
+            base_url,
+            data={
+                'access_token': token,
+                'batch': json.dumps(items)
+            },
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json(), time.monotonic() - started
+
+    def submit(self, base_url: str, token: str, items: list, tokens: Optional[List[str]] = None) -> Future:
+        """
+        Queue one batch POST and return a future of (item responses, seconds).
+        `token` is the batch level token, `tokens` every token used by the
+        items (when they carry their own); a slot of each is held until the
+        POST finishes. Slots are always taken in sorted order so two mixed
+        batches can never wait on each other.
+        """
+        slots = [self._slot(t) for t in sorted(set(tokens or [token]))]
+        for slot in slots:
+            slot.acquire()
+
+        def release(_):
+            for slot in slots:
+                slot.release()
+
+        try:
+            future = self._pool.submit(self._post, base_url, token, items)
+        except Exception:
+            release(None)
+            raise
+        future.add_done_callback(release)
+        return future
+
+
+class GraphBatchPacker:
+    """
+    Fills batches with insight requests of every caller.
+
+    Callers hand in single (token, item) requests whose relative_url carries
+    its own access_token, so items of different pages (and of the Facebook
+    and Instagram fetches running in parallel) can share one POST. The POST
+    itself is sent with `batch_token`, a token valid for every item in it
+    (the account's user token); items are only packed together when they
+    share it, so one page's expired token never fails another page's items.
+    Without a batch token every token gets batches of its own. Full
+    batches are sent at once; a partly filled batch waits `linger` seconds
+    for requests of other callers before it goes out. Every item response
+    is routed back to the caller that asked for it.
+
+    Each item's status is checked on the way back. Items that failed for a
+    transient reason (or whose whole POST failed) are queued again after an
+    exponential backoff and packed into new batches with whatever else is
+    pending, so only the failed items are asked again. A POST that failed
+    as a whole is only retried when is_retryable_failure() says so. After
+    `max_attempts`, or at once for a permanent POST failure, the last answer
+    is handed back as is (None if the POST itself failed); check it with
+    is_retryable().
+
+    The batch size is learned by the adaptive sizer ("graph_batch"): it
+    shrinks when a POST times out or items answer "reduce the amount of
+    data", and grows again while batches come back fast.
+    """
+
+    def __init__(self, runner: GraphBatchRunner, sizer: AdaptiveSizer, linger: float = 0.05,
+                 max_attempts: int = 3, backoff: float = 2):
+        self.runner = runner
+        self.sizer = sizer
+        self.linger = linger
+        self.max_attempts = max(1, max_attempts)
+        self.backoff = backoff
+        self._pending = defaultdict(list)  # (base_url, batch token) -> [(token, item, future, attempt)]
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, runner: GraphBatchRunner, sizer: AdaptiveSizer):
+        return cls(
+            runner,
+            sizer,
+            linger=float(os.getenv("GRAPH_BATCH_LINGER_MS", 50)) / 1000,
+            max_attempts=int(os.getenv("GRAPH_BATCH_MAX_ATTEMPTS", 3)),
+            backoff=float(os.getenv("GRAPH_BATCH_RETRY_BACKOFF", 2)),
+        )
+
+    def fetch(self, base_url: str, requests: List[Tuple[str, dict]], batch_token: Optional[str] = None) -> List[Optional[dict]]:
+        """Item responses of (token, item) requests in the order given, None where the batch failed"""
+        futures = [self._add((base_url, batch_token or token), token, item) for token, item in requests]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception:
+                results.append(None)
+        return results
+
+    def _add(self, key: tuple, token: str, item: dict, future: Optional[Future] = None, attempt: int = 1) -> Future:
+        future = future or Future()
+        full = None
+        with self._lock:
+            pending = self._pending[key]
+            pending.append((token, item, future, attempt))
+            if len(pending) >= self.batch_size():
+                full = self._take(key)
+            elif key not in self._timers:
+                timer = threading.Timer(self.linger, self._flush, args=(key,))
+                timer.daemon = True
+                self._timers[key] = timer
+                timer.start()
+        if full:
+            self._send(key, full)
+        return future
+
+    def batch_size(self) -> int:
+        return min(self.sizer.size("graph_batch"), MAX_BATCH_SIZE)
+
+    def _take(self, key: tuple) -> list:
+        size = self.batch_size()
+        pending = self._pending[key]
+        self._pending[key] = pending[size:]
+        return pending[:size]
+
+    def _flush(self, key: tuple):
+        with self._lock:
+            self._timers.pop(key, None)
+            batches = []
+            while self._pending[key]:
+                batches.append(self._take(key))
+        for batch in batches:
+            self._send(key, batch)
+
+    def _send(self, key: tuple, batch: list):
+        base_url, batch_token = key
+        tokens = [token for token, _, _, _ in batch]
+        try:
+            future = self.runner.submit(base_url, batch_token, [item for _, item, _, _ in batch], tokens + [batch_token])
+        except Exception as e:
+            for _, _, waiter, _ in batch:
+                waiter.set_exception(e)
+            return
+
+        def route(done):
+            retry_post = False
+            try:
+                responses, seconds = done.result()
+                if any(item_error(response).get('code') == 1 for response in responses):
+                    self.sizer.shrink("graph_batch", len(batch))
+                else:
+                    self.sizer.observe("graph_batch", seconds)
+            except Exception as e:
+                print(f"Batch request failed ({len(batch)} items): {str(e)}")
+                if asks_for_less(e):
+                    self.sizer.shrink("graph_batch", len(batch))
+                retry_post = is_retryable_failure(e)
+                if not retry_post:
+                    print(f"❌ Not retrying {len(batch)} batch items, the POST failed permanently")
+                responses = []
+
+            retried = 0
+            for index, entry in enumerate(batch):
+                response = responses[index] if index < len(responses) else None
+                retryable = retry_post if response is None and not responses else is_retryable(response)
+                if retryable and entry[3] < self.max_attempts:
+                    self._retry(key, entry)
+                    retried += 1
+                else:
+                    entry[2].set_result(response)
+            if retried:
+                print(f"🔁 Retrying {retried}/{len(batch)} batch items")
+
+        future.add_done_callback(route)
+
+    def _retry(self, key: tuple, entry: tuple):
+        """Queue a failed item again after a jittered exponential backoff"""
+        token, item, future, attempt = entry
+        delay = self.backoff * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+        timer = threading.Timer(delay, self._add, args=(key, token, item, future, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+
+_shared_runner = None
+_shared_lock = threading.Lock()
+
+
+def get_graph_batch_runner() -> GraphBatchRunner:
+    global _shared_runner
+    if _shared_runner is None:
+        with _shared_lock:
+            if _shared_runner is None:
+                _shared_runner = GraphBatchRunner.from_env()
+    return _shared_runner
+
+
+_shared_packer = None
+
+
+def get_graph_batch_packer() -> GraphBatchPacker:
+    global _shared_packer
+    if _shared_packer is None:
+        runner = get_graph_batch_runner()
+        sizer = get_adaptive_sizer()
+        with _shared_lock:
+            if _shared_packer is None:
+                _shared_packer = GraphBatchPacker.from_env(runner, sizer)
+    return _shared_packer
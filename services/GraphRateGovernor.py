@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+# Graph error codes that mean "slow down" rather than "bad request"
+# 4 app, 17 user, 32 page, 613 custom, 800xx business use case limits
+THROTTLE_ERROR_CODES = {4, 17, 32, 613, 80001, 80002, 80005, 80006, 80008}
+
+
+def token_fingerprint(token: Optional[str]) -> str:
+    """Short stable id for an access token so we never log or key by the token itself"""
+    if not token:
+        return "app"
+    return hashlib.sha1(token.encode("utf-8")).hexdigest()[:12]
+
+
+def _usage_percent(usage: dict) -> float:
+    return max(
+        float(usage.get("call_count", 0) or 0),
+        float(usage.get("total_cputime", 0) or 0),
+        float(usage.get("total_time", 0) or 0),
+    )
+
+
+class GraphRateGovernor:
+    """
+    Paces Graph API calls from the usage headers Meta sends back.
+
+    Every response carries X-App-Usage (whole app), X-Page-Usage (the page
+    whose token made the call) and X-Business-Use-Case-Usage. We keep the
+    latest percentage per app and per token and delay the next call of a
+    token linearly once its budget passes `soft_limit`, up to `max_delay`.
+    At `hard_limit`, or when Meta reports a throttle error or a regain
+    time, the token is parked until the budget should be back.
+
+    Only the hot token waits. Worker threads holding other pages' tokens
+    keep going, so near-limit pages are pushed back behind the rest instead
+    of stalling the whole run.
+    """
+
+    def __init__(self, soft_limit: float = 75, hard_limit: float = 95, max_delay: float = 10.0,
+                 cooldown: float = 60.0, max_retries: int = 2):
+        self.soft_limit = soft_limit
+        self.hard_limit = hard_limit
+        self.max_delay = max_delay
+        self.cooldown = cooldown
+        self.max_retries = max_retries
+        self._app_usage = 0.0
+        self._token_usage: Dict[str, float] = {}
+        self._blocked_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a governor from the optional GRAPH_USAGE_* settings in .env"""
+        return cls(
+            soft_limit=float(os.getenv("GRAPH_USAGE_SOFT_LIMIT", 75)),
+            hard_limit=float(os.getenv("GRAPH_USAGE_HARD_LIMIT", 95)),
+            max_delay=float(os.getenv("GRAPH_USAGE_MAX_DELAY", 10)),
+            cooldown=float(os.getenv("GRAPH_THROTTLE_COOLDOWN", 60)),
+        )
+
+    @staticmethod
+    def _token_of(url: str, kwargs: dict) -> Optional[str]:
+        for source in (kwargs.get("params"), kwargs.get("data")):
+            if isinstance(source, dict) and source.get("access_token"):
+                return source["access_token"]
+        # paging.next URLs carry the token in the query string
+        values = parse_qs(urlsplit(url).query).get("access_token")
+        return values[0] if values else None
+
+    def usage(self, key: str) -> float:
+        with self._lock:
+            return max(self._app_usage, self._token_usage.get(key, 0.0))
+
+    def _delay_for(self, key: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            blocked = max(self._blocked_until.get(key, 0.0), self._blocked_until.get("app", 0.0))
+            usage = max(self._app_usage, self._token_usage.get(key, 0.0))
+        if blocked > now:
+            return blocked - now
+        if usage >= self.hard_limit:
+            return self.cooldown
+        if usage > self.soft_limit:
+            return self.max_delay * (usage - self.soft_limit) / (self.hard_limit - self.soft_limit)
+        return 0.0
+
+    def before_request(self, url: str, kwargs: dict):
+        """Block the calling thread until its token has budget left"""
+        key = token_fingerprint(self._token_of(url, kwargs))
+        delay = self._delay_for(key)
+        if delay <= 0:
+            return
+        if delay >= 1:
+            print(f"⏳ Graph usage at {self.usage(key):.0f}% for token {key}, waiting {delay:.1f}s")
+        time.sleep(delay)
+
+    def after_response(self, url: str, kwargs: dict, response, attempt: int) -> bool:
+        """Record the usage headers; True means the call was throttled and should be sent again"""
+        key = token_fingerprint(self._token_of(url, kwargs))
+        self.observe(key, response.headers)
+
+        if response.status_code < 400:
+            return False
+        try:
+            error = response.json().get("error", {})
+        except ValueError:
+            return False
+        if error.get("code") not in THROTTLE_ERROR_CODES:
+            return False
+
+        scope = "app" if error.get("code") == 4 else key
+        with self._lock:
+            self._blocked_until[scope] = max(self._blocked_until.get(scope, 0.0), time.monotonic() + self.cooldown)
+        print(f"🚦 Graph throttled token {scope} (code {error.get('code')}): {error.get('message', '')}")
+        return attempt < self.max_retries
+
+    def observe(self, key: str, headers):
+        """Update budgets from X-App-Usage, X-Page-Usage and X-Business-Use-Case-Usage"""
+        app = self._parse(headers.get("X-App-Usage"))
+        page = self._parse(headers.get("X-Page-Usage"))
+        business = self._parse(headers.get("X-Business-Use-Case-Usage"))
+
+        token_usage = None
+        regain_minutes = 0.0
+        if page:
+            token_usage = _usage_percent(page)
+            regain_minutes = float(page.get("estimated_time_to_regain_access", 0) or 0)
+        for entries in (business or {}).values():
+            for entry in entries if isinstance(entries, list) else []:
+                token_usage = max(token_usage or 0.0, _usage_percent(entry))
+                regain_minutes = max(regain_minutes, float(entry.get("estimated_time_to_regain_access", 0) or 0))
+
+        with self._lock:
+            if app:
+                self._app_usage = _usage_percent(app)
+            if token_usage is not None:
+                self._token_usage[key] = token_usage
+            if regain_minutes > 0:
+                self._blocked_until[key] = max(self._blocked_until.get(key, 0.0), time.monotonic() + regain_minutes * 60)
+
+    @staticmethod
+    def _parse(value: Optional[str]) -> Optional[dict]:
+        if not value:
+            return None
+        try:
+            parsed = json.loads(value)
+        except ValueError:
+            return None
+        return parsed if isinstance(parsed, dict) else None
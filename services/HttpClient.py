@@ -0,0 +1,152 @@
+import os
+import threading
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from services.GraphRateGovernor import GraphRateGovernor
+
+# Keep-alive connections kept open per host, sized to how hard we hit each API
+DEFAULT_POOL_SIZES = {
+    "graph.facebook.com": 16,
+    "twitter-api45.p.rapidapi.com": 4,
+    "facebook-pages-scraper2.p.rapidapi.com": 4,
+    "www.googleapis.com": 4,
+}
+DEFAULT_POOL_SIZE = 8
+
+# (connect, read) in seconds, used when the caller does not pass a timeout
+DEFAULT_TIMEOUT = (5, 30)
+
+
+def default_retry_policy() -> Retry:
+    """
+    Retry connection errors and transient 5xx answers with backoff.
+
+    Only idempotent methods are retried on a bad status, a Graph batch POST
+    would resend all 50 items for one failure. 429 and Graph throttling
+    codes are left to the rate governor and callers, retrying them here
+    too would multiply the attempts and ignore the shared cooldown. The
+    last response is returned as is so callers keep their own status
+    handling.
+    """
+    return Retry(
+        total=3,
+        connect=3,
+        read=2,
+        backoff_factor=1,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class HttpClient:
+    """
+    Shared requests layer with one pooled keep-alive session per host.
+
+    Sessions are created lazily the first time a host is called and then
+    reused by every controller, so repeated calls to graph.facebook.com or
+    RapidAPI skip the TCP + TLS handshake. requests.Session is safe to share
+    between threads as long as its settings are not changed after creation.
+    """
+
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None, timeout=DEFAULT_TIMEOUT, retry_policy=default_retry_policy):
+        self.pool_sizes = {**DEFAULT_POOL_SIZES, **(pool_sizes or {})}
+        self.timeout = timeout
+        self.retry_policy = retry_policy
+        self._sessions: Dict[str, requests.Session] = {}
+        self._governors = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a client from the optional HTTP_* settings in .env"""
+        timeout = (
+            float(os.getenv("HTTP_CONNECT_TIMEOUT", DEFAULT_TIMEOUT[0])),
+            float(os.getenv("HTTP_READ_TIMEOUT", DEFAULT_TIMEOUT[1])),
+        )
+        pool_sizes = {}
+        if os.getenv("GRAPH_POOL_SIZE"):
+            pool_sizes["graph.facebook.com"] = int(os.getenv("GRAPH_POOL_SIZE"))
+        return cls(pool_sizes=pool_sizes, timeout=timeout)
+
+    def set_governor(self, host: str, governor):
+        """
+        Attach a rate governor to every call made to `host`.
+
+        The governor gets before_request(url, kwargs) ahead of each call and
+        after_response(url, kwargs, response, attempt) after it, which
+        returns True when the call was throttled and should be sent again.
+        """
+        self._governors[host] = governor
+
+    def _session_for(self, url: str) -> requests.Session:
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        session = self._sessions.get(key)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                pool_size = self.pool_sizes.get(parts.hostname, DEFAULT_POOL_SIZE)
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=pool_size,
+                    max_retries=self.retry_policy(),
+                    pool_block=False,
+                )
+                session = requests.Session()
+                session.headers.update({"Accept-Encoding": "gzip, deflate"})
+                session.mount(key, adapter)
+                self._sessions[key] = session
+            return session
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        session = self._session_for(url)
+        governor = self._governors.get(urlsplit(url).hostname)
+        if governor is None:
+            return session.request(method, url, **kwargs)
+
+        attempt = 0
+        while True:
+            governor.before_request(url, kwargs)
+            response = session.request(method, url, **kwargs)
+            if not governor.after_response(url, kwargs, response, attempt):
+                return response
+            attempt += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """Process-wide client shared by all controllers"""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                client = HttpClient.from_env()
+                client.set_governor("graph.facebook.com", GraphRateGovernor.from_env())
+                _shared_client = client
+    return _shared_client
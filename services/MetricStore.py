@@ -0,0 +1,154 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+def iter_days(start: date, end: date) -> Iterable[date]:
+    day = start
+    while day <= end:
+        yield day
+        day += timedelta(days=1)
+
+
+def missing_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    """Group sorted days into (first, last) runs of consecutive days"""
+    ranges = []
+    for day in days:
+        if ranges and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+class MetricStore:
+    """
+    Local time series of insight values, so a daily run only fetches the
+    days it has not seen yet and computes month-to-date and year-to-date
+    totals from disk.
+
+    `daily` holds one value per object, metric and day. `coverage` records
+    which days were fetched for an object and metric group, so days where
+    the API had no value are not asked for again. `totals` holds metric
+    totals over a closed period, for APIs that only return period totals
+    (Instagram total_value metrics).
+    """
+
+    def __init__(self, path: str = None):
+        directory = os.getenv("STATE_DIR", "state")
+        self.path = path or os.path.join(directory, "metrics.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self.refresh_days = int(os.getenv("METRIC_REFRESH_DAYS", 3))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS daily (
+                    object_id TEXT, metric TEXT, day TEXT, value REAL,
+                    PRIMARY KEY (object_id, metric, day)
+                );
+                CREATE TABLE IF NOT EXISTS coverage (
+                    object_id TEXT, scope TEXT, day TEXT,
+                    PRIMARY KEY (object_id, scope, day)
+                );
+                CREATE TABLE IF NOT EXISTS totals (
+                    object_id TEXT, scope TEXT, start TEXT, end TEXT, metrics TEXT,
+                    PRIMARY KEY (object_id, scope, start, end)
+                );
+                """
+            )
+
+    def days_to_fetch(self, object_id: str, scope: str, start: date, end: date) -> List[date]:
+        """
+        Days in [start, end] that were never fetched, plus the last
+        `refresh_days` days, whose values Meta still revises.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day FROM coverage WHERE object_id = ? AND scope = ? AND day BETWEEN ? AND ?",
+                (object_id, scope, start.isoformat(), end.isoformat()),
+            ).fetchall()
+        covered: Set[str] = {row[0] for row in rows}
+        settled_before = end - timedelta(days=self.refresh_days - 1)
+        return [
+            day for day in iter_days(start, end)
+            if day.isoformat() not in covered or day >= settled_before
+        ]
+
+    def put_days(self, object_id: str, scope: str, values: Dict[str, Dict[str, float]], days: Iterable[date]):
+        """Store {metric: {YYYY-MM-DD: value}} and mark `days` as fetched"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO daily (object_id, metric, day, value) VALUES (?, ?, ?, ?)",
+                [
+                    (object_id, metric, day, value)
+                    for metric, by_day in values.items()
+                    for day, value in by_day.items()
+                ],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO coverage (object_id, scope, day) VALUES (?, ?, ?)",
+                [(object_id, scope, day.isoformat()) for day in days],
+            )
+
+    def sum_days(self, object_id: str, metrics: Iterable[str], start: date, end: date) -> Dict[str, float]:
+        metrics = list(metrics)
+        totals = {metric: 0 for metric in metrics}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT metric, SUM(value) FROM daily WHERE object_id = ? AND day BETWEEN ? AND ? "
+                f"AND metric IN ({','.join('?' * len(metrics))}) GROUP BY metric",
+                (object_id, start.isoformat(), end.isoformat(), *metrics),
+            ).fetchall()
+        for metric, total in rows:
+            totals[metric] = int(total) if float(total).is_integer() else total
+        return totals
+
+    def get_day(self, object_id: str, metrics: Iterable[str], day: date) -> Dict[str, float]:
+        metrics = list(metrics)
+        values = {metric: 0 for metric in metrics}
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT metric, value FROM daily WHERE object_id = ? AND day = ? "
+                f"AND metric IN ({','.join('?' * len(metrics))})",
+                (object_id, day.isoformat(), *metrics),
+            ).fetchall()
+        for metric, value in rows:
+            values[metric] = int(value) if float(value).is_integer() else value
+        return values
+
+    def get_total(self, object_id: str, scope: str, start: date, end: date) -> Optional[Dict[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT metrics FROM totals WHERE object_id = ? AND scope = ? AND start = ? AND end = ?",
+                (object_id, scope, start.isoformat(), end.isoformat()),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_total(self, object_id: str, scope: str, start: date, end: date, totals: Dict[str, float]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO totals (object_id, scope, start, end, metrics) VALUES (?, ?, ?, ?, ?)",
+                (object_id, scope, start.isoformat(), end.isoformat(), json.dumps(totals)),
+            )
+
+    def is_settled(self, day: date, today: date) -> bool:
+        """True once `day` is old enough that Meta no longer revises it"""
+        return day <= today - timedelta(days=self.refresh_days)
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_metric_store() -> MetricStore:
+    global _shared_store
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = MetricStore()
+    return _shared_store
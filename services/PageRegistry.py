@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from typing import List, Optional
+
+from services.GraphRateGovernor import token_fingerprint
+from services.StateStore import StateStore
+
+
+class PageRegistry:
+    """
+    Remembers which pages (and linked IG accounts) each Facebook account
+    manages, so startup does not have to page through /{user}/accounts on
+    every run.
+
+    Only page id, name and IG link are kept, never page tokens; the entry
+    also records a fingerprint of the user token it was listed with. An
+    entry is trusted for `ttl` seconds and only while the account still
+    uses the same token, after that the account is listed again in full
+    and the differences are reported. The caller still checks the cached
+    ids against an id-only listing every run, so a newly granted page is
+    picked up on the next run; the TTL only bounds how long names and IG
+    links may lag. PAGE_REGISTRY_FORCE_REFRESH=1 ignores every entry.
+    """
+
+    def __init__(self, ttl: float = 7 * 24 * 3600, force_refresh: bool = False):
+        self.ttl = ttl
+        self.force_refresh = force_refresh
+        self.state = StateStore("page_registry")
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            ttl=float(os.getenv("PAGE_REGISTRY_TTL_HOURS", 168)) * 3600,
+            force_refresh=os.getenv("PAGE_REGISTRY_FORCE_REFRESH", "0") == "1",
+        )
+
+    @staticmethod
+    def _summary(page: dict) -> dict:
+        ig = page.get('instagram_business_account') or {}
+        return {'id': page.get('id'), 'name': page.get('name'), 'ig_id': ig.get('id')}
+
+    def fresh_pages(self, account_id: str, user_token: str) -> Optional[List[dict]]:
+        """Cached page summaries, or None when the entry is missing, stale or from another token"""
+        entry = self.state.get(account_id)
+        if not entry or self.force_refresh:
+            return None
+        if entry.get('token') != token_fingerprint(user_token):
+            print(f"🔑 Token changed for account {account_id}, listing pages again")
+            return None
+        if time.time() - entry.get('listed_at', 0) > self.ttl:
+            return None
+        return entry.get('pages', [])
+
+    def save(self, account_id: str, user_token: str, pages: List[dict], listed: bool):
+        """Store the current page set; `listed` restarts the TTL (a full listing, not a revalidation)"""
+        previous = self.state.get(account_id) or {}
+        summaries = [self._summary(page) for page in pages]
+        self._report_changes(account_id, previous.get('pages'), summaries)
+        self.state.set(account_id, {
+            'token': token_fingerprint(user_token),
+            'listed_at': time.time() if listed else previous.get('listed_at', 0),
+            'pages': summaries,
+        })
+
+    @staticmethod
+    def _report_changes(account_id: str, old: Optional[List[dict]], new: List[dict]):
+        if old is None:
+            return
+        old_by_id = {page['id']: page for page in old}
+        new_by_id = {page['id']: page for page in new}
+        for page_id in new_by_id.keys() - old_by_id.keys():
+            print(f"➕ Account {account_id}: new page {new_by_id[page_id]['name']} ({page_id})")
+        for page_id in old_by_id.keys() - new_by_id.keys():
+            print(f"➖ Account {account_id}: page {old_by_id[page_id]['name']} ({page_id}) is gone")
+        for page_id in old_by_id.keys() & new_by_id.keys():
+            if old_by_id[page_id]['ig_id'] != new_by_id[page_id]['ig_id']:
+                print(f"🔗 Account {account_id}: IG link of {page_id} changed "
+                      f"{old_by_id[page_id]['ig_id']} -> {new_by_id[page_id]['ig_id']}")
+
+
+_shared_registry = None
+_shared_lock = threading.Lock()
+
+
+def get_page_registry() -> PageRegistry:
+    global _shared_registry
+    if _shared_registry is None:
+        with _shared_lock:
+            if _shared_registry is None:
+                _shared_registry = PageRegistry.from_env()
+    return _shared_registry
@@ -0,0 +1,96 @@
+import queue
+import threading
+from typing import Callable, Iterable, List
+
+# Marks the end of the stream for one worker of a stage
+_STOP = object()
+
+
+class Stage:
+    """One step of the pipeline: `workers` threads reading from a bounded input queue."""
+
+    def __init__(self, name: str, func: Callable, workers: int = 1, queue_size: int = 16):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        self.input = queue.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.failed = 0
+        self._active = self.workers
+        self._lock = threading.Lock()
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues.
+
+    Every stage function receives one item and returns a list of items for
+    the next stage (return an empty list to drop the item). Because each
+    queue is bounded, a slow stage blocks the stages in front of it instead
+    of letting work pile up in memory.
+    """
+
+    def __init__(self, name: str = "pipeline"):
+        self.name = name
+        self.stages: List[Stage] = []
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1, queue_size: int = 16):
+        self.stages.append(Stage(name, func, workers, queue_size))
+        return self
+
+    def run(self, items: Iterable):
+        """Feed items into the first stage and block until every stage has drained"""
+        if not self.stages:
+            return
+
+        threads = []
+        for index, stage in enumerate(self.stages):
+            downstream = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for worker in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stage, downstream),
+                    name=f"{self.name}-{stage.name}-{worker}",
+                    daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+
+        first = self.stages[0]
+        for item in items:
+            first.input.put(item)  # blocks while the first stage is saturated
+        for _ in range(first.workers):
+            first.input.put(_STOP)
+
+        for thread in threads:
+            thread.join()
+
+        for stage in self.stages:
+            print(f"📦 Stage '{stage.name}': {stage.processed} processed, {stage.failed} failed")
+
+    def _work(self, stage: Stage, downstream):
+        while True:
+            item = stage.input.get()
+            if item is _STOP:
+                break
+            try:
+                outputs = stage.func(item) or []
+                with stage._lock:
+                    stage.processed += 1
+            except Exception as e:
+                print(f"❌ Stage '{stage.name}' failed: {str(e)}")
+                with stage._lock:
+                    stage.failed += 1
+                continue
+
+            if downstream is not None:
+                for output in outputs:
+                    downstream.input.put(output)  # backpressure from the next stage
+
+        # The last worker out closes the next stage
+        with stage._lock:
+            stage._active -= 1
+            last_worker = stage._active == 0
+        if last_worker and downstream is not None:
+            for _ in range(downstream.workers):
+                downstream.input.put(_STOP)
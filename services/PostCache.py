@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+from typing import Iterable, List, Optional
+
+
+class PostCache:
+    """
+    Post metadata of every page seen in earlier runs, plus a per-page
+    watermark (newest created_time and post id listed so far).
+
+    A run only has to list posts newer than the watermark; the rest of the
+    reporting window comes from here. created_time is kept exactly as Graph
+    returns it ("2025-06-01T12:00:00+0000"), which sorts as text, so window
+    bounds can be plain "YYYY-MM-DD" strings.
+    """
+
+    def __init__(self, path: str = None):
+        directory = os.getenv("STATE_DIR", "state")
+        self.path = path or os.path.join(directory, "posts.sqlite3")
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS posts (
+                    page_id TEXT, post_id TEXT, created_time TEXT, message TEXT,
+                    PRIMARY KEY (page_id, post_id)
+                );
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    page_id TEXT PRIMARY KEY, newest_time TEXT, newest_id TEXT
+                );
+                """
+            )
+
+    def watermark(self, page_id: str) -> Optional[str]:
+        """created_time of the newest post listed for the page, None before the first listing"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT newest_time FROM watermarks WHERE page_id = ?", (page_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, page_id: str, posts: Iterable[dict], listed_until: str, advance: bool = True):
+        """
+        Store freshly listed posts and move the watermark to the newest one.
+        A page listed without new posts still gets a watermark (the listing
+        bound), so the next run does not list the whole window again. Pass
+        advance=False for a listing that broke off, its posts are kept but
+        the gap behind them must be listed again.
+        """
+        rows = [
+            (page_id, post['id'], post.get('created_time', ''), post.get('message') or '')
+            for post in posts if post.get('id')
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO posts (page_id, post_id, created_time, message) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            if not advance:
+                return
+            newest = max(rows, key=lambda row: row[2], default=None)
+            current = self._conn.execute(
+                "SELECT newest_time FROM watermarks WHERE page_id = ?", (page_id,)
+            ).fetchone()
+            if newest is not None and (current is None or newest[2] > current[0]):
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO watermarks (page_id, newest_time, newest_id) VALUES (?, ?, ?)",
+                    (page_id, newest[2], newest[1]),
+                )
+            elif current is None:
+                self._conn.execute(
+                    "INSERT INTO watermarks (page_id, newest_time, newest_id) VALUES (?, ?, NULL)",
+                    (page_id, listed_until),
+                )
+
+    def window(self, page_id: str, since: str, until: str) -> List[dict]:
+        """Cached posts with since <= created_time < until, newest first, shaped like /posts items"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT post_id, created_time, message FROM posts "
+                "WHERE page_id = ? AND created_time >= ? AND created_time < ? ORDER BY created_time DESC",
+                (page_id, since, until),
+            ).fetchall()
+        return [{'id': post_id, 'created_time': created_time, 'message': message} for post_id, created_time, message in rows]
+
+    def prune(self, page_id: str, before: str):
+        """Forget posts that fell out of the reporting window"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM posts WHERE page_id = ? AND created_time < ?", (page_id, before))
+
+    def forget(self, page_id: str, post_id: str):
+        """Drop a post Graph no longer knows (deleted)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM posts WHERE page_id = ? AND post_id = ?", (page_id, post_id))
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_post_cache() -> PostCache:
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = PostCache()
+    return _shared_cache
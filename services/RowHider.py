@@ -0,0 +1,126 @@
+import threading
+from datetime import date, datetime
+from typing import List, Optional, Tuple
+
+from services.StateStore import StateStore
+
+
+def coalesce_rows(rows: List[int]) -> List[Tuple[int, int]]:
+    """Turn 0-based row indexes into [start, end) ranges of contiguous rows"""
+    ranges = []
+    for row in sorted(set(rows)):
+        if ranges and ranges[-1][1] == row:
+            ranges[-1] = (ranges[-1][0], row + 1)
+        else:
+            ranges.append((row, row + 1))
+    return ranges
+
+
+class RowHider:
+    """
+    Hides post rows once their write date (column Q) is old enough.
+
+    New rows are always inserted at row 3, so the column is newest first.
+    A per-tab high-water mark remembers the newest date already hidden, and
+    the scan reads the column top-down in chunks and stops once it reaches
+    rows at or below that mark. Rows the user or an earlier run already hid
+    are skipped, and the remaining ones are sent as one request per
+    contiguous block instead of one per row. Delete the state file to force
+    a full rescan.
+    """
+
+    def __init__(self, chunk_size: int = 1000, date_column: str = "Q", first_row: int = 3):
+        self.chunk_size = chunk_size
+        self.date_column = date_column
+        self.first_row = first_row
+        self.watermarks = StateStore("hide_watermarks")
+
+    @staticmethod
+    def _parse_date(value: str) -> Optional[date]:
+        try:
+            return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+        except (AttributeError, ValueError):
+            return None
+
+    def _read_chunk(self, sheet, spreadsheet_id: str, tab_name: str, start_row: int):
+        """Dates and hidden flags of one chunk, read together in a single call"""
+        end_row = start_row + self.chunk_size - 1
+        result = sheet.get(
+            spreadsheetId=spreadsheet_id,
+            ranges=[f"{tab_name}!{self.date_column}{start_row}:{self.date_column}{end_row}"],
+            fields="sheets(data(rowData(values(formattedValue)),rowMetadata(hiddenByUser)))",
+        ).execute()
+        data = (result.get("sheets") or [{}])[0].get("data") or [{}]
+        row_data = data[0].get("rowData", [])
+        row_metadata = data[0].get("rowMetadata", [])
+
+        dates = []
+        for row in row_data:
+            values = row.get("values") or [{}]
+            dates.append(values[0].get("formattedValue", ""))
+        hidden = [meta.get("hiddenByUser", False) for meta in row_metadata[:len(dates)]]
+        hidden += [False] * (len(dates) - len(hidden))
+        return dates, hidden
+
+    def hide_aged_rows(self, service, spreadsheet_id: str, tab_name: str, sheet_id: int, cutoff: date) -> int:
+        """Hide every visible row dated on or before `cutoff`, returns how many rows were hidden"""
+        sheet = service.spreadsheets()
+        key = f"{spreadsheet_id}|{tab_name}"
+        watermark = self._parse_date(self.watermarks.get(key, ""))
+
+        rows_to_hide = []
+        start_row = self.first_row
+        while True:
+            dates, hidden = self._read_chunk(sheet, spreadsheet_id, tab_name, start_row)
+            if not dates:
+                break
+
+            last_date = None
+            for offset, (value, is_hidden) in enumerate(zip(dates, hidden)):
+                row_date = self._parse_date(value)
+                if row_date is None:
+                    continue
+                last_date = row_date
+                if row_date <= cutoff and not is_hidden:
+                    rows_to_hide.append(start_row - 1 + offset)  # 0-based row index
+
+            # Everything further down is older and was handled by an earlier run
+            if watermark is not None and last_date is not None and last_date <= watermark:
+                break
+            if len(dates) < self.chunk_size:
+                break
+            start_row += self.chunk_size
+
+        ranges = coalesce_rows(rows_to_hide)
+        if ranges:
+            requests = [{
+                "updateDimensionProperties": {
+                    "range": {
+                        "sheetId": sheet_id,
+                        "dimension": "ROWS",
+                        "startIndex": start,
+                        "endIndex": end,
+                    },
+                    "properties": {"hiddenByUser": True},
+                    "fields": "hiddenByUser",
+                }
+            } for start, end in ranges]
+            sheet.batchUpdate(spreadsheetId=spreadsheet_id, body={"requests": requests}).execute()
+
+        if watermark is None or cutoff > watermark:
+            self.watermarks.set(key, cutoff.isoformat())
+        print(f"✅ Hidden {len(rows_to_hide)} rows in {len(ranges)} ranges with date <= {cutoff}.")
+        return len(rows_to_hide)
+
+
+_shared_hider = None
+_shared_lock = threading.Lock()
+
+
+def get_row_hider() -> RowHider:
+    global _shared_hider
+    if _shared_hider is None:
+        with _shared_lock:
+            if _shared_hider is None:
+                _shared_hider = RowHider()
+    return _shared_hider
@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+
+
+class RunJournal:
+    """
+    Append-only JSONL journal of finished units for one run date.
+
+    A unit is one account x page x stage (e.g. "FB1|1234567890|fb_posts"),
+    the file itself is per date (run_journal/2025-06-10.jsonl). Rerunning
+    main.py for the same date skips units already marked done and only
+    redoes failed or missing ones. Delete the file to force a full rerun.
+    """
+
+    def __init__(self, run_date: str, directory: str = "run_journal"):
+        self.run_date = run_date
+        self.path = os.path.join(directory, f"{run_date}.jsonl")
+        self._lock = threading.Lock()
+        self._status: Dict[str, str] = {}
+
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+        done = sum(1 for status in self._status.values() if status == "done")
+        print(f"RunJournal initialized for {run_date}: {done} units already done")
+
+    @staticmethod
+    def unit_id(*parts) -> str:
+        return "|".join(str(part) for part in parts)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # a half written line from a crashed run
+                self._status[entry["unit"]] = entry["status"]
+
+    def _append(self, unit: str, status: str, note: Optional[str] = None):
+        entry = {
+            "unit": unit,
+            "status": status,
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        if note:
+            entry["note"] = note
+        with self._lock:
+            self._status[unit] = status
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+
+    def is_done(self, unit: str) -> bool:
+        with self._lock:
+            return self._status.get(unit) == "done"
+
+    def all_done(self, units: Iterable[str]) -> bool:
+        with self._lock:
+            return all(self._status.get(unit) == "done" for unit in units)
+
+    def mark_done(self, unit: str, note: Optional[str] = None):
+        self._append(unit, "done", note)
+
+    def mark_failed(self, unit: str, error: Optional[str] = None):
+        self._append(unit, "failed", error)
+
+    def summary(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {"done": 0, "failed": 0}
+            for status in self._status.values():
+                counts[status] = counts.get(status, 0) + 1
+            return counts
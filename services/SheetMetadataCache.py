@@ -0,0 +1,73 @@
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+
+class SheetMetadataCache:
+    """
+    Per-run cache of tab properties, keyed by spreadsheet ID.
+
+    The first lookup fetches only `sheets.properties` (sheetId, title,
+    gridProperties of every tab) with a field mask; later lookups of any tab
+    in that spreadsheet are served from memory. Nobody else changes the
+    structure of our report sheets during a run, so the entry only has to be
+    dropped after our own structural writes (inserting rows or columns,
+    resizing the grid).
+    """
+
+    def __init__(self):
+        self._tabs: Dict[str, Dict[str, dict]] = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = defaultdict(threading.Lock)
+
+    def _load(self, service, spreadsheet_id: str) -> Dict[str, dict]:
+        with self._lock:
+            tabs = self._tabs.get(spreadsheet_id)
+            fetch_lock = self._fetch_locks[spreadsheet_id]
+        if tabs is not None:
+            return tabs
+
+        # One fetch per spreadsheet even when several writers ask at once
+        with fetch_lock:
+            with self._lock:
+                tabs = self._tabs.get(spreadsheet_id)
+            if tabs is not None:
+                return tabs
+
+            metadata = service.spreadsheets().get(
+                spreadsheetId=spreadsheet_id,
+                fields='sheets.properties'
+            ).execute()
+            tabs = {
+                sheet['properties']['title']: sheet['properties']
+                for sheet in metadata.get('sheets', [])
+            }
+            with self._lock:
+                self._tabs[spreadsheet_id] = tabs
+            return tabs
+
+    def properties(self, service, spreadsheet_id: str, tab_name: str) -> Optional[dict]:
+        """Properties of one tab (sheetId, title, gridProperties...) or None if it does not exist"""
+        return self._load(service, spreadsheet_id).get(tab_name)
+
+    def sheet_id(self, service, spreadsheet_id: str, tab_name: str) -> Optional[int]:
+        properties = self.properties(service, spreadsheet_id, tab_name)
+        return properties['sheetId'] if properties else None
+
+    def invalidate(self, spreadsheet_id: str):
+        """Forget a spreadsheet after we changed its structure"""
+        with self._lock:
+            self._tabs.pop(spreadsheet_id, None)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_sheet_metadata_cache() -> SheetMetadataCache:
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = SheetMetadataCache()
+    return _shared_cache
@@ -0,0 +1,26 @@
+from typing import Callable, Dict, Optional, Tuple
+
+# Post tabs keep two header rows, data starts on sheet row 3
+FIRST_DATA_ROW = 3
+
+# Column Q holds the date a post row was last written
+DATE_COLUMN = 16
+
+
+def index_rows_by_id(existing_rows: list, compare_date: str,
+                     row_id: Callable[[list], Optional[str]]) -> Dict[str, Tuple[int, list]]:
+    """
+    Map id -> (sheet row number, row) for the post rows last written on
+    compare_date, `row_id` reading the id out of a row (None to skip it).
+
+    Built once per tab so matching each incoming post is a dict lookup
+    instead of a scan over every row. When an id appears on several rows
+    of that date, the last one in sheet order wins, as with the old scan.
+    """
+    index = {}
+    for row_index, row in enumerate(existing_rows):
+        if len(row) > DATE_COLUMN and row[DATE_COLUMN] == compare_date:
+            key = row_id(row)
+            if key:
+                index[key] = (row_index + FIRST_DATA_ROW, row)
+    return index
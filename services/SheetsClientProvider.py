@@ -0,0 +1,83 @@
+import threading
+from typing import Dict, Sequence, Tuple
+
+from google.auth.transport.requests import Request
+from google.oauth2.service_account import Credentials
+from googleapiclient.discovery import build
+
+from config.config import Config
+from services.SheetsScheduler import scheduled_http
+
+SHEETS_SCOPES = ("https://www.googleapis.com/auth/spreadsheets",)
+SHEETS_READONLY_SCOPES = ("https://www.googleapis.com/auth/spreadsheets.readonly",)
+
+
+class SheetsClientProvider:
+    """
+    Hands out Google Sheets services without rebuilding them on every call.
+
+    Service account credentials are created once per scope set and keep
+    their access token until it expires, so the OAuth exchange happens about
+    once an hour instead of once per controller method. Services are built
+    from the bundled (static) discovery document and cached per thread,
+    because the httplib2 transport underneath is not thread safe.
+    """
+
+    def __init__(self):
+        self._credentials: Dict[Tuple[str, ...], Credentials] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generation = 0
+
+    def credentials(self, scopes: Sequence[str] = SHEETS_SCOPES) -> Credentials:
+        key = tuple(scopes)
+        with self._lock:
+            creds = self._credentials.get(key)
+            if creds is None:
+                creds = Credentials.from_service_account_info(Config.as_dict(), scopes=list(key))
+                self._credentials[key] = creds
+            # One thread refreshes, the others reuse the new token
+            if not creds.valid:
+                print("🔑 Refreshing Google Sheets access token...")
+                creds.refresh(Request())
+            return creds
+
+    def service(self, scopes: Sequence[str] = SHEETS_SCOPES):
+        """Sheets service for the calling thread"""
+        key = tuple(scopes)
+        services = getattr(self._local, "services", None)
+        if services is None or getattr(self._local, "generation", None) != self._generation:
+            services = self._local.services = {}
+            self._local.generation = self._generation
+
+        service = services.get(key)
+        if service is None:
+            creds = self.credentials(key)
+            service = build("sheets", "v4", http=scheduled_http(creds), static_discovery=True, cache_discovery=False)
+            services[key] = service
+        else:
+            self.credentials(key)  # refresh ahead of the request if the token ran out
+        return service
+
+    def reset(self):
+        """Drop cached credentials and services, e.g. after a 401"""
+        with self._lock:
+            self._credentials.clear()
+            self._generation += 1
+
+
+_shared_provider = None
+_shared_lock = threading.Lock()
+
+
+def get_sheets_client_provider() -> SheetsClientProvider:
+    global _shared_provider
+    if _shared_provider is None:
+        with _shared_lock:
+            if _shared_provider is None:
+                _shared_provider = SheetsClientProvider()
+    return _shared_provider
+
+
+def get_sheets_service(scopes: Sequence[str] = SHEETS_SCOPES):
+    return get_sheets_client_provider().service(scopes)
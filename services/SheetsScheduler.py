@@ -0,0 +1,165 @@
+import os
+import random
+import threading
+import time
+from typing import Dict, Tuple
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+
+# Sheets API per-minute quotas (https://developers.google.com/sheets/api/limits)
+DEFAULT_QUOTAS = {
+    "project_read": 300,
+    "project_write": 300,
+    "user_read": 60,
+    "user_write": 60,
+}
+
+# Statuses worth sending again; writes are only retried when Google says it never ran them
+READ_RETRY_STATUSES = {429, 500, 502, 503, 504}
+WRITE_RETRY_STATUSES = {429, 503}
+
+
+class TokenBucket:
+    """Refills `rate_per_minute` tokens per minute and holds at most `burst` of them"""
+
+    def __init__(self, rate_per_minute: float, burst: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self) -> float:
+        """Take one token and return how long the caller has to wait for it"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1  # may go negative: later callers queue behind this one
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            return max(wait, self.paused_until - now)
+
+    def pause(self, seconds: float):
+        """Stop handing out tokens for a while and forget the saved-up burst"""
+        with self._lock:
+            now = time.monotonic()
+            self.paused_until = max(self.paused_until, now + seconds)
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = now
+
+
+class SheetsScheduler:
+    """
+    Process-wide gate in front of every Google Sheets call.
+
+    Each call takes a token from the project bucket and from the bucket of
+    the calling service account, for reads or writes depending on the HTTP
+    method, so all sheet controllers together stay under the per-minute
+    quotas instead of each discovering them through 429s. A 429 that still
+    gets through pauses the matching buckets for everyone and the call is
+    retried with jittered backoff.
+    """
+
+    def __init__(self, quotas: Dict[str, int] = None, burst_seconds: float = 10.0, max_retries: int = 5):
+        self.quotas = {**DEFAULT_QUOTAS, **(quotas or {})}
+        self.burst_seconds = burst_seconds
+        self.max_retries = max_retries
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Build a scheduler from the optional SHEETS_*_PER_MINUTE settings in .env"""
+        quotas = {
+            name: int(os.getenv(f"SHEETS_{name.upper()}_PER_MINUTE", default))
+            for name, default in DEFAULT_QUOTAS.items()
+        }
+        return cls(quotas=quotas)
+
+    def _bucket(self, scope: str, kind: str) -> TokenBucket:
+        key = (scope, kind)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                quota_name = f"{'project' if scope == 'project' else 'user'}_{kind}"
+                rate = self.quotas[quota_name]
+                bucket = TokenBucket(rate, rate * self.burst_seconds / 60.0)
+                self._buckets[key] = bucket
+            return bucket
+
+    def acquire(self, kind: str, user: str):
+        """Block until one `kind` ("read" or "write") call is allowed for `user`"""
+        wait = max(
+            self._bucket("project", kind).reserve(),
+            self._bucket(user, kind).reserve(),
+        )
+        if wait > 0:
+            if wait >= 1:
+                print(f"⏳ Sheets {kind} quota: waiting {wait:.1f}s")
+            time.sleep(wait)
+
+    def backoff(self, kind: str, user: str, attempt: int) -> float:
+        """Pause the buckets after a rejected call and return the delay applied"""
+        delay = min(64.0, 2 ** attempt) + random.uniform(0, 1)
+        self._bucket("project", kind).pause(delay)
+        self._bucket(user, kind).pause(delay)
+        return delay
+
+
+class ScheduledHttp:
+    """httplib2-compatible wrapper that sends every request through the scheduler"""
+
+    def __init__(self, http, scheduler: SheetsScheduler, user: str):
+        self._http = http
+        self._scheduler = scheduler
+        self._user = user
+
+    def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+        kind = "read" if method in ("GET", "HEAD") else "write"
+        retry_statuses = READ_RETRY_STATUSES if kind == "read" else WRITE_RETRY_STATUSES
+        attempt = 0
+        while True:
+            self._scheduler.acquire(kind, self._user)
+            try:
+                resp, content = self._http.request(uri, method, body=body, headers=headers, **kwargs)
+            except ConnectionResetError:
+                if attempt >= self._scheduler.max_retries:
+                    raise
+                resp, content = None, None
+
+            if resp is not None and resp.status not in retry_statuses:
+                return resp, content
+            if attempt >= self._scheduler.max_retries:
+                return resp, content
+
+            delay = self._scheduler.backoff(kind, self._user, attempt)
+            status = resp.status if resp is not None else "connection reset"
+            print(f"[{status}] Sheets {kind} rejected, retrying in {delay:.1f}s...")
+            attempt += 1
+
+    def __getattr__(self, name):
+        return getattr(self._http, name)
+
+
+_shared_scheduler = None
+_shared_lock = threading.Lock()
+
+
+def get_sheets_scheduler() -> SheetsScheduler:
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        with _shared_lock:
+            if _shared_scheduler is None:
+                _shared_scheduler = SheetsScheduler.from_env()
+    return _shared_scheduler
+
+
+def scheduled_http(creds) -> ScheduledHttp:
+    """Authorized http for googleapiclient.build(http=...) that is paced by the shared scheduler"""
+    user = getattr(creds, "service_account_email", None) or "default"
+    return ScheduledHttp(AuthorizedHttp(creds, http=httplib2.Http(timeout=60)), get_sheets_scheduler(), user)
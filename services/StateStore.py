@@ -0,0 +1,50 @@
+import json
+import os
+import threading
+from typing import Any
+
+
+class StateStore:
+    """
+    Small JSON key/value file for state that has to survive between runs
+    (watermarks, caches). Every set() rewrites the file through a temp file
+    so a crash never leaves it half written.
+    """
+
+    def __init__(self, name: str, directory: str = None):
+        directory = directory or os.getenv("STATE_DIR", "state")
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{name}.json")
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ Ignoring unreadable state file {self.path}: {e}")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._data[key] = value
+            self._save()
+
+    def update(self, values: dict):
+        with self._lock:
+            self._data.update(values)
+            self._save()
+
+    def delete(self, key: str):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -2,6 +2,7 @@ import requests
 import datetime
 import logging
 from typing import Optional, Dict
+from services.HttpClient import get_http_client
 
 class FacebookTokenValidator:
     def __init__(self, base_url: str, app_id: str, app_secret: str):
@@ -15,6 +16,7 @@ class FacebookTokenValidator:
         self.app_id = app_id
         self.app_secret = app_secret
         self.base_url = base_url
+        self.http = get_http_client()
         self.logger = logging.getLogger('FacebookTokenValidator')
 
     def check_token_validity(self, access_token: str) -> Dict:
@@ -39,7 +41,7 @@ class FacebookTokenValidator:
         }
         
         try:
-            response = requests.get(debug_url, params=params).json()
+            response = self.http.get(debug_url, params=params).json()
             if 'error' in response:
                 return {
                     'is_valid': False,
@@ -83,7 +85,7 @@ class FacebookTokenValidator:
         }
         
         try:
-            response = requests.get(exchange_url, params=params).json()
+            response = self.http.get(exchange_url, params=params).json()
             if 'access_token' in response:
                 return response['access_token']
             self.logger.error(f"Token refresh failed: {response}")
@@ -112,7 +114,7 @@ class FacebookTokenValidator:
         }
         
         try:
-            response = requests.get(extend_url, params=params).json()
+            response = self.http.get(extend_url, params=params).json()
             if 'access_token' in response:
                 return response['access_token']
             self.logger.error(f"Long-lived token generation failed: {response}")
@@ -0,0 +1,38 @@
+import threading
+from typing import Dict
+
+from services.StateStore import StateStore
+
+
+class VideoCache:
+    """
+    Metadata (title, publish date, url) of the recent videos of every
+    YouTube channel, keyed by the channel's uploads playlist, so
+    videos().list is only called for videos not seen in an earlier run.
+
+    Each save() replaces the channel's entry with the videos still inside
+    the reporting window, which keeps the file from growing with the
+    channel's history.
+    """
+
+    def __init__(self):
+        self.state = StateStore("youtube_videos")
+
+    def known(self, playlist_id: str) -> Dict[str, dict]:
+        return dict(self.state.get(playlist_id) or {})
+
+    def save(self, playlist_id: str, videos: Dict[str, dict]):
+        self.state.set(playlist_id, videos)
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_video_cache() -> VideoCache:
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_lock:
+            if _shared_cache is None:
+                _shared_cache = VideoCache()
+    return _shared_cache
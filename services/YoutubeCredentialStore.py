@@ -0,0 +1,133 @@
+import os
+import pickle
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+
+from google.auth.transport.requests import Request
+from googleapiclient.discovery import build
+
+TOKENS_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tokens"))
+
+# (service name, version) of the APIs built per credential
+YOUTUBE_APIS = {
+    "data": ("youtube", "v3"),
+    "analytics": ("youtubeAnalytics", "v2"),
+}
+
+
+class YoutubeCredentialStore:
+    """
+    Loads each YouTube OAuth token file once and keeps it fresh.
+
+    A background thread refreshes every loaded credential `refresh_margin`
+    seconds before its access token expires and writes the refreshed token
+    back to its pickle, so runs never wait on a refresh round trip and the
+    next process starts from a valid token. Refreshing happens in place,
+    which lets the services built from a credential keep working across
+    refreshes. Services (Data API and Analytics API, from the bundled
+    discovery documents) are cached per thread and credential, because the
+    httplib2 transport underneath is not thread safe.
+    """
+
+    def __init__(self, tokens_dir: str = TOKENS_DIR, refresh_margin: float = 600, check_every: float = 60):
+        self.tokens_dir = tokens_dir
+        self.refresh_margin = refresh_margin
+        self.check_every = check_every
+        self._creds: Dict[str, object] = {}      # token filename -> credentials
+        self._lock = threading.Lock()
+        self._refresh_locks = defaultdict(threading.Lock)  # token filename -> lock, one refresh at a time
+        self._refresher = None
+        self._local = threading.local()  # .services: (id(credentials), api) -> service
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            refresh_margin=float(os.getenv("YOUTUBE_TOKEN_REFRESH_MARGIN_SECONDS", 600)),
+            check_every=float(os.getenv("YOUTUBE_TOKEN_CHECK_SECONDS", 60)),
+        )
+
+    def credentials(self, token_filename: str):
+        """Credentials of a token file; only an already expired token is refreshed here, the rest is left to the background thread"""
+        with self._lock:
+            creds = self._creds.get(token_filename)
+            if creds is None:
+                with open(os.path.join(self.tokens_dir, token_filename), "rb") as token_file:
+                    creds = pickle.load(token_file)
+                self._creds[token_filename] = creds
+            refresh_lock = self._refresh_locks[token_filename]
+            self._start_refresher()
+        with refresh_lock:
+            if self._needs_refresh(creds) and not creds.valid:
+                self._refresh(token_filename, creds)
+        return creds
+
+    def service(self, creds, api: str):
+        """The calling thread's "data" or "analytics" service of a credential, built on first use"""
+        services = getattr(self._local, "services", None)
+        if services is None:
+            services = self._local.services = {}
+        key = (id(creds), api)
+        service = services.get(key)
+        if service is None:
+            name, version = YOUTUBE_APIS[api]
+            service = build(name, version, credentials=creds, static_discovery=True, cache_discovery=False)
+            services[key] = service
+        return service
+
+    def _needs_refresh(self, creds) -> bool:
+        if not getattr(creds, "refresh_token", None):
+            return False
+        expiry = getattr(creds, "expiry", None)  # naive UTC
+        if expiry is None:
+            return not creds.valid
+        return expiry - timedelta(seconds=self.refresh_margin) <= datetime.now(timezone.utc).replace(tzinfo=None)
+
+    def _refresh(self, token_filename: str, creds):
+        print(f"🔑 Refreshing YouTube token {token_filename}...")
+        creds.refresh(Request())
+        self._save(token_filename, creds)
+
+    def _save(self, token_filename: str, creds):
+        path = os.path.join(self.tokens_dir, token_filename)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as token_file:
+            pickle.dump(creds, token_file)
+        os.replace(tmp_path, path)
+
+    def _start_refresher(self):
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="yt-token-refresh", daemon=True)
+            self._refresher.start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.check_every)
+            with self._lock:
+                due = [
+                    (name, creds, self._refresh_locks[name])
+                    for name, creds in self._creds.items() if self._needs_refresh(creds)
+                ]
+            for token_filename, creds, refresh_lock in due:
+                try:
+                    with refresh_lock:
+                        if self._needs_refresh(creds):
+                            self._refresh(token_filename, creds)
+                except Exception as e:
+                    # Retried on the next check, and credentials() refreshes synchronously if it comes to that
+                    print(f"⚠️ Background refresh of {token_filename} failed: {str(e)}")
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_youtube_credential_store() -> YoutubeCredentialStore:
+    global _shared_store
+    if _shared_store is None:
+        with _shared_lock:
+            if _shared_store is None:
+                _shared_store = YoutubeCredentialStore.from_env()
+    return _shared_store